@@ -1,24 +1,117 @@
 from __future__ import annotations
 
+import json
 import os
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict
 
-import yaml
-
 
 BASE_DIR = Path(__file__).resolve().parent
 CONFIG_PATH = BASE_DIR / "config" / "settings.yaml"
+# Распарсенный settings.yaml в JSON: воркеры читают его вместо повторного YAML-парсинга
+CONFIG_CACHE_PATH = CONFIG_PATH.with_name(CONFIG_PATH.name + ".cache.json")
+
+
+def _read_config_cache(yaml_mtime: float) -> Dict[str, Any] | None:
+    try:
+        if CONFIG_CACHE_PATH.stat().st_mtime < yaml_mtime:
+            return None
+        with CONFIG_CACHE_PATH.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _write_config_cache(data: Dict[str, Any]) -> None:
+    # Пишем во временный файл и атомарно подменяем, чтобы параллельные воркеры
+    # никогда не увидели недописанный JSON. Read-only FS или не-JSON типы — не ошибка.
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=CONFIG_CACHE_PATH.parent, prefix=CONFIG_CACHE_PATH.name, suffix=".tmp"
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, CONFIG_CACHE_PATH)
+        tmp_path = None
+    except (OSError, TypeError, ValueError):
+        pass
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
 
 
+@lru_cache(maxsize=1)
 def _load_config() -> Dict[str, Any]:
-    if CONFIG_PATH.exists():
-        with CONFIG_PATH.open("r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-            if not isinstance(data, dict):
-                raise ValueError("settings.yaml должен содержать объект верхнего уровня")
-            return data
-    return {}
+    try:
+        yaml_mtime = CONFIG_PATH.stat().st_mtime
+    except FileNotFoundError:
+        return {}
+    cached = _read_config_cache(yaml_mtime)
+    if cached is not None:
+        return cached
+    # yaml импортируем только здесь: без settings.yaml или при живом JSON-кэше он не нужен
+    import yaml
+
+    try:  # pragma: no cover - libyaml bindings are optional
+        from yaml import CSafeLoader as _YamlLoader
+    except ImportError:  # noqa: S110
+        from yaml import SafeLoader as _YamlLoader
+
+    with CONFIG_PATH.open("r", encoding="utf-8") as f:
+        data = yaml.load(f, Loader=_YamlLoader) or {}
+    if not isinstance(data, dict):
+        raise ValueError("settings.yaml должен содержать объект верхнего уровня")
+    _write_config_cache(data)
+    return data
+
+
+_ENV_KEYS = (
+    "OLLAMA_BASE_URL",
+    "OLLAMA_MODEL",
+    "OLLAMA_KEEP_ALIVE",
+    "QDRANT_URL",
+    "QDRANT_COLLECTION",
+    "QDRANT_PREFER_GRPC",
+    "QDRANT_GRPC_PORT",
+    "EMBEDDING_MODEL",
+    "EMBED_DEVICE",
+    "EMBED_BATCH",
+    "EMBED_CACHE",
+    "RAG_TOP_K",
+    "RERANK_ENABLE",
+    "RERANK_DEBUG",
+    "RERANKER_MODEL",
+    "RERANK_DEVICE",
+    "RERANK_KEEP",
+    "RERANK_BATCH",
+    "RERANK_COALESCE_MS",
+    "RERANK_COMPILE",
+    "STARTUP_CHECKS",
+    "SELF_CHECK_TIMEOUT",
+    "SELF_CHECK_GEN",
+    "STARTUP_CUDA_NAME",
+    "SCORING_MODE",
+    "SCORE_GREEN",
+    "SCORE_YELLOW",
+    "BUSINESS_MAX_TOKENS",
+    "BUSINESS_RETRY_STEP",
+    "OVERVIEW_MAX_CHARS",
+    "PROMPTS_DIR",
+)
+
+
+@lru_cache(maxsize=1)
+def _env_snapshot() -> Dict[str, str | None]:
+    # Переменные окружения читаются один раз на процесс; в тестах — _env_snapshot.cache_clear()
+    return {key: os.environ.get(key) for key in _ENV_KEYS}
 
 
 def _to_bool(value: Any) -> bool:
@@ -31,8 +124,64 @@ def _to_bool(value: Any) -> bool:
     return False
 
 
+def _env_str(key: str, default: Any) -> Any:
+    return _env_snapshot().get(key) or default
+
+
+def _env_int(key: str, default: Any) -> int:
+    value = _env_snapshot().get(key)
+    return int(value) if value is not None else int(default)
+
+
+def _env_bool(key: str, default: Any) -> bool:
+    value = _env_snapshot().get(key)
+    return _to_bool(value if value is not None else default)
+
+
+@dataclass(frozen=True, slots=True)
 class Settings:
-    def __init__(self) -> None:
+    # Ollama
+    OLLAMA_URL: str
+    OLLAMA_MODEL: str
+    OLLAMA_KEEP_ALIVE: str
+    # RAG
+    QDRANT_URL: str
+    QDRANT_COLLECTION: str
+    QDRANT_PREFER_GRPC: bool
+    QDRANT_GRPC_PORT: int
+    EMBEDDING_MODEL: str
+    EMBED_DEVICE: str
+    EMBED_BATCH: int
+    EMBED_CACHE: str
+    RAG_TOP_K: int
+    # Reranker
+    RERANK_ENABLE: bool
+    RERANKER_MODEL: str
+    RERANK_DEVICE: str
+    RERANK_KEEP: int
+    RERANK_BATCH: int
+    RERANK_COALESCE_MS: int
+    RERANK_COMPILE: bool
+    RERANK_DEBUG: bool
+    # Startup flags
+    STARTUP_CHECKS: bool
+    SELF_CHECK_TIMEOUT: int
+    SELF_CHECK_GEN: bool
+    STARTUP_CUDA_NAME: bool
+    # Scoring / UI
+    SCORING_MODE: str
+    SCORE_GREEN: int
+    SCORE_YELLOW: int
+    BUSINESS_MAX_TOKENS: int
+    BUSINESS_RETRY_STEP: int
+    OVERVIEW_MAX_CHARS: int
+    # Prompts
+    PROMPTS_DIR: Path
+    PROMPTS: Dict[str, str]
+
+    @classmethod
+    def from_env_and_yaml(cls) -> "Settings":
+        values: Dict[str, Any] = {}
         cfg = _load_config()
 
         ollama_cfg = cfg.get("ollama", {}) if isinstance(cfg.get("ollama"), dict) else {}
@@ -43,60 +192,47 @@ class Settings:
         prompts_cfg = cfg.get("prompts", {}) if isinstance(cfg.get("prompts"), dict) else {}
 
         # Ollama
-        self.OLLAMA_URL = os.getenv("OLLAMA_BASE_URL") or ollama_cfg.get("url", "http://127.0.0.1:11434")
-        self.OLLAMA_MODEL = os.getenv("OLLAMA_MODEL") or ollama_cfg.get("model", "krith/qwen2.5-32b-instruct:IQ4_XS")
+        values["OLLAMA_URL"] = _env_str("OLLAMA_BASE_URL", ollama_cfg.get("url", "http://127.0.0.1:11434"))
+        values["OLLAMA_MODEL"] = _env_str("OLLAMA_MODEL", ollama_cfg.get("model", "krith/qwen2.5-32b-instruct:IQ4_XS"))
+        values["OLLAMA_KEEP_ALIVE"] = _env_str("OLLAMA_KEEP_ALIVE", ollama_cfg.get("keep_alive", "30m"))
 
         # RAG
-        self.QDRANT_URL = os.getenv("QDRANT_URL") or rag_cfg.get("qdrant_url", "http://qdrant:6333")
-        self.QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION") or rag_cfg.get("collection", "ru_law_m3")
-        self.EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL") or rag_cfg.get("embedding_model", "BAAI/bge-m3")
-        self.EMBED_DEVICE = os.getenv("EMBED_DEVICE") or rag_cfg.get("embed_device", "auto")
-        rag_top_k_env = os.getenv("RAG_TOP_K")
-        self.RAG_TOP_K = int(rag_top_k_env) if rag_top_k_env is not None else int(rag_cfg.get("top_k", 8))
+        values["QDRANT_URL"] = _env_str("QDRANT_URL", rag_cfg.get("qdrant_url", "http://qdrant:6333"))
+        values["QDRANT_COLLECTION"] = _env_str("QDRANT_COLLECTION", rag_cfg.get("collection", "ru_law_m3"))
+        values["QDRANT_PREFER_GRPC"] = _env_bool("QDRANT_PREFER_GRPC", rag_cfg.get("prefer_grpc", True))
+        values["QDRANT_GRPC_PORT"] = _env_int("QDRANT_GRPC_PORT", rag_cfg.get("grpc_port", 6334))
+        values["EMBEDDING_MODEL"] = _env_str("EMBEDDING_MODEL", rag_cfg.get("embedding_model", "BAAI/bge-m3"))
+        values["EMBED_DEVICE"] = _env_str("EMBED_DEVICE", rag_cfg.get("embed_device", "auto"))
+        values["EMBED_BATCH"] = _env_int("EMBED_BATCH", rag_cfg.get("embed_batch", 64))
+        values["EMBED_CACHE"] = _env_str("EMBED_CACHE", rag_cfg.get("embed_cache", "/workspace/corpus/.emb_cache.sqlite"))
+        values["RAG_TOP_K"] = _env_int("RAG_TOP_K", rag_cfg.get("top_k", 8))
 
         # Reranker
-        rerank_enable_env = os.getenv("RERANK_ENABLE")
-        rerank_debug_env = os.getenv("RERANK_DEBUG")
-        self.RERANK_ENABLE = _to_bool(rerank_enable_env if rerank_enable_env is not None else rerank_cfg.get("enable", True))
-        self.RERANKER_MODEL = os.getenv("RERANKER_MODEL") or rerank_cfg.get("model", "BAAI/bge-reranker-v2-m3")
-        self.RERANK_DEVICE = os.getenv("RERANK_DEVICE") or rerank_cfg.get("device", "auto")
-        rerank_keep_env = os.getenv("RERANK_KEEP")
-        self.RERANK_KEEP = int(rerank_keep_env) if rerank_keep_env is not None else int(rerank_cfg.get("keep", 5))
-        rerank_batch_env = os.getenv("RERANK_BATCH")
-        self.RERANK_BATCH = int(rerank_batch_env) if rerank_batch_env is not None else int(rerank_cfg.get("batch", 16))
-        self.RERANK_DEBUG = _to_bool(rerank_debug_env if rerank_debug_env is not None else rerank_cfg.get("debug", False))
+        values["RERANK_ENABLE"] = _env_bool("RERANK_ENABLE", rerank_cfg.get("enable", True))
+        values["RERANKER_MODEL"] = _env_str("RERANKER_MODEL", rerank_cfg.get("model", "BAAI/bge-reranker-v2-m3"))
+        values["RERANK_DEVICE"] = _env_str("RERANK_DEVICE", rerank_cfg.get("device", "auto"))
+        values["RERANK_KEEP"] = _env_int("RERANK_KEEP", rerank_cfg.get("keep", 5))
+        values["RERANK_BATCH"] = _env_int("RERANK_BATCH", rerank_cfg.get("batch", 16))
+        values["RERANK_COALESCE_MS"] = _env_int("RERANK_COALESCE_MS", rerank_cfg.get("coalesce_ms", 10))
+        values["RERANK_COMPILE"] = _env_bool("RERANK_COMPILE", rerank_cfg.get("compile", False))
+        values["RERANK_DEBUG"] = _env_bool("RERANK_DEBUG", rerank_cfg.get("debug", False))
 
         # Startup flags
-        startup_checks_env = os.getenv("STARTUP_CHECKS")
-        self.STARTUP_CHECKS = _to_bool(startup_checks_env if startup_checks_env is not None else startup_cfg.get("checks", True))
-        self_check_timeout_env = os.getenv("SELF_CHECK_TIMEOUT")
-        self.SELF_CHECK_TIMEOUT = int(self_check_timeout_env) if self_check_timeout_env is not None else int(startup_cfg.get("self_check_timeout", 5))
-        self_check_gen_env = os.getenv("SELF_CHECK_GEN")
-        self.SELF_CHECK_GEN = _to_bool(self_check_gen_env if self_check_gen_env is not None else startup_cfg.get("self_check_gen", False))
-        startup_cuda_env = os.getenv("STARTUP_CUDA_NAME")
-        self.STARTUP_CUDA_NAME = _to_bool(startup_cuda_env if startup_cuda_env is not None else startup_cfg.get("cuda_name", False))
+        values["STARTUP_CHECKS"] = _env_bool("STARTUP_CHECKS", startup_cfg.get("checks", True))
+        values["SELF_CHECK_TIMEOUT"] = _env_int("SELF_CHECK_TIMEOUT", startup_cfg.get("self_check_timeout", 5))
+        values["SELF_CHECK_GEN"] = _env_bool("SELF_CHECK_GEN", startup_cfg.get("self_check_gen", False))
+        values["STARTUP_CUDA_NAME"] = _env_bool("STARTUP_CUDA_NAME", startup_cfg.get("cuda_name", False))
 
         # Scoring / UI
-        self.SCORING_MODE = os.getenv("SCORING_MODE") or scoring_cfg.get("mode", "strict")
-        score_green_env = os.getenv("SCORE_GREEN")
-        self.SCORE_GREEN = int(score_green_env) if score_green_env is not None else int(scoring_cfg.get("score_green", 75))
-        score_yellow_env = os.getenv("SCORE_YELLOW")
-        self.SCORE_YELLOW = int(score_yellow_env) if score_yellow_env is not None else int(scoring_cfg.get("score_yellow", 51))
-        business_max_tokens_env = os.getenv("BUSINESS_MAX_TOKENS")
-        self.BUSINESS_MAX_TOKENS = (
-            int(business_max_tokens_env)
-            if business_max_tokens_env is not None
-            else int(scoring_cfg.get("business_max_tokens", 1400))
-        )
-        business_retry_env = os.getenv("BUSINESS_RETRY_STEP")
-        self.BUSINESS_RETRY_STEP = (
-            int(business_retry_env)
-            if business_retry_env is not None
-            else int(scoring_cfg.get("business_retry_step", 400))
-        )
+        values["SCORING_MODE"] = _env_str("SCORING_MODE", scoring_cfg.get("mode", "strict"))
+        values["SCORE_GREEN"] = _env_int("SCORE_GREEN", scoring_cfg.get("score_green", 75))
+        values["SCORE_YELLOW"] = _env_int("SCORE_YELLOW", scoring_cfg.get("score_yellow", 51))
+        values["BUSINESS_MAX_TOKENS"] = _env_int("BUSINESS_MAX_TOKENS", scoring_cfg.get("business_max_tokens", 1400))
+        values["BUSINESS_RETRY_STEP"] = _env_int("BUSINESS_RETRY_STEP", scoring_cfg.get("business_retry_step", 400))
+        values["OVERVIEW_MAX_CHARS"] = _env_int("OVERVIEW_MAX_CHARS", scoring_cfg.get("overview_max_chars", 8000))
 
         # Prompts configuration
-        prompt_dir_env = os.getenv("PROMPTS_DIR")
+        prompt_dir_env = _env_str("PROMPTS_DIR", None)
         if prompt_dir_env:
             prompt_dir = Path(prompt_dir_env)
         else:
@@ -104,8 +240,8 @@ class Settings:
             prompt_dir = Path(dir_from_cfg) if dir_from_cfg else BASE_DIR / "prompts"
         if not prompt_dir.is_absolute():
             prompt_dir = (BASE_DIR / prompt_dir).resolve()
-        self.PROMPTS_DIR = prompt_dir
-        self.PROMPTS: Dict[str, str] = {
+        values["PROMPTS_DIR"] = prompt_dir
+        values["PROMPTS"] = {
             "analyze_system": prompts_cfg.get("analyze_system", "analyze_system.txt"),
             "analyze_user": prompts_cfg.get("analyze_user", "analyze_user.txt"),
             "analyze_system_lenient_rule": prompts_cfg.get(
@@ -116,6 +252,7 @@ class Settings:
             "overview_system": prompts_cfg.get("overview_system", "overview_system.txt"),
             "overview_user": prompts_cfg.get("overview_user", "overview_user.txt"),
         }
+        return cls(**values)
 
 
-settings = Settings()
+settings = Settings.from_env_and_yaml()
@@ -1,37 +1,82 @@
+import json
+from typing import Any, Dict, List
+
 import httpx
 from ..config import settings
-from ..utils import extract_json
+from ..utils import JsonObjectTracker, extract_json
+
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    # Один клиент на процесс: keep-alive пул вместо нового TCP-соединения на каждый вызов
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(180.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _stream_json_text(client: httpx.AsyncClient, url: str, payload: Dict[str, Any]) -> str:
+    # Читаем поток и обрываем его, как только объект сбалансирован: хвост генерации
+    # до num_predict не ждём (Ollama прекращает генерацию при закрытии соединения)
+    tracker = JsonObjectTracker()
+    parts: List[str] = []
+    async with client.stream("POST", url, json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(f"ollama: {chunk['error']}")
+            piece = (chunk.get("message") or {}).get("content") or chunk.get("response") or ""
+            if piece:
+                parts.append(piece)
+                if tracker.feed(piece):
+                    break
+            if chunk.get("done"):
+                break
+    return "".join(parts)
+
 
 async def ollama_chat_json(system_msg: str, user_msg: str, model: str | None, max_tokens: int = 1024):
+    # keep_alive держит модель (и KV-кэш общего префикса промпта) загруженной между запросами;
+    # системные промпты мемоизированы, поэтому префикс побайтно совпадает
     payload = {
         "model": model or settings.OLLAMA_MODEL,
         "messages": [{"role": "system", "content": system_msg},
                      {"role": "user", "content": user_msg}],
-        "stream": False,
+        "stream": True,
         "options": {"temperature": 0.2, "num_predict": max_tokens},
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
         "format": "json",
     }
-    async with httpx.AsyncClient(timeout=180.0) as client:
-        r = await client.post(f"{settings.OLLAMA_URL}/api/chat", json=payload)
-        r.raise_for_status()
-        data = r.json()
-    txt = (data.get("message") or {}).get("content") or data.get("response") or ""
-    parsed = extract_json(txt)
-    if parsed:
-        return parsed
-    # fallback
+    client = _get_client()
+    txt = await _stream_json_text(client, f"{settings.OLLAMA_URL}/api/chat", payload)
+    if txt.strip():
+        # format=json на /api/chat уже даёт JSON; повторный запрос его не исправит
+        return extract_json(txt)
+    # fallback: чат вернул пустой ответ
     g_payload = {
         "model": model or settings.OLLAMA_MODEL,
         "prompt": f"{system_msg}\n\n{user_msg}",
-        "stream": False,
+        "stream": True,
         "options": {"temperature": 0.2, "num_predict": max_tokens},
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
         "format": "json",
     }
-    async with httpx.AsyncClient(timeout=180.0) as client:
-        r = await client.post(f"{settings.OLLAMA_URL}/api/generate", json=g_payload)
-        r.raise_for_status()
-        g_data = r.json()
-    return extract_json(g_data.get("response", ""))
+    g_txt = await _stream_json_text(client, f"{settings.OLLAMA_URL}/api/generate", g_payload)
+    return extract_json(g_txt)
 
 async def ollama_generate(prompt: str, max_tokens: int = 512, model: str | None = None):
     payload = {
@@ -39,8 +84,9 @@ async def ollama_generate(prompt: str, max_tokens: int = 512, model: str | None
         "prompt": prompt,
         "stream": False,
         "options": {"temperature": 0.2, "num_predict": max_tokens},
+        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
     }
-    async with httpx.AsyncClient(timeout=180.0) as client:
-        r = await client.post(f"{settings.OLLAMA_URL}/api/generate", json=payload)
-        r.raise_for_status()
-        return r.json().get("response", "")
+    client = _get_client()
+    r = await client.post(f"{settings.OLLAMA_URL}/api/generate", json=payload)
+    r.raise_for_status()
+    return r.json().get("response", "")
@@ -5,6 +5,7 @@ from .routes.analyze import router as analyze_router
 from .routes.connectivity import router as net_router
 from .routes.doc import router as doc_router
 from .startup import register_startup
+from .llm.ollama import close_client as close_ollama_client
 
 def create_app() -> FastAPI:
     app = FastAPI(title="Legal AI Backend", version="0.5.0")
@@ -14,4 +15,5 @@ def create_app() -> FastAPI:
     app.include_router(net_router)
     app.include_router(doc_router) 
     register_startup(app)  # лёгкие startup-проверки
+    app.add_event_handler("shutdown", close_ollama_client)
     return app
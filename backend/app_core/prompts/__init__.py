@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from functools import lru_cache
 from pathlib import Path
+from string import Formatter
+from typing import Dict, Optional, Tuple
 
 from ..config import settings
 
@@ -13,17 +14,54 @@ def _resolve_prompt_path(name: str) -> Path:
     return path
 
 
-@lru_cache(maxsize=None)
+# Шаблоны заполняются при старте (preload_prompts) и дальше читаются из памяти
+_TEMPLATES: Dict[str, str] = {}
+_COMPILED: Dict[str, Tuple[Tuple[str, Optional[str]], ...]] = {}
+
+
 def get_prompt_template(name: str) -> str:
-    path = _resolve_prompt_path(name)
-    if not path.exists():
-        raise FileNotFoundError(f"Prompt template '{name}' not found at {path}")
-    return path.read_text(encoding="utf-8")
+    template = _TEMPLATES.get(name)
+    if template is None:
+        path = _resolve_prompt_path(name)
+        if not path.exists():
+            raise FileNotFoundError(f"Prompt template '{name}' not found at {path}")
+        # read_bytes не нормализует переводы строк, как read_text: приводим CRLF/CR к "\n"
+        text = path.read_bytes().decode("utf-8").removeprefix("\ufeff")
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        template = _TEMPLATES[name] = text
+    return template
+
+
+def _compile_template(text: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """Разбивает шаблон str.format на пары (литерал, имя поля) один раз."""
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(text):
+        if field is not None and (spec or conversion or not field.isidentifier()):
+            raise ValueError(f"Unsupported placeholder {{{field}}} in prompt template")
+        parts.append((literal, field))
+    return tuple(parts)
+
+
+def _compiled_prompt(name: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    compiled = _COMPILED.get(name)
+    if compiled is None:
+        compiled = _COMPILED[name] = _compile_template(get_prompt_template(name))
+    return compiled
+
+
+def preload_prompts() -> None:
+    """Читает и компилирует все шаблоны из settings.PROMPTS заранее."""
+    for name in settings.PROMPTS:
+        _compiled_prompt(name)
 
 
 def render_prompt(name: str, **kwargs) -> str:
-    template = get_prompt_template(name)
-    return template.format(**kwargs)
+    out = []
+    for literal, field in _compiled_prompt(name):
+        out.append(literal)
+        if field is not None:
+            out.append(str(kwargs[field]))
+    return "".join(out)
 
 
-__all__ = ["get_prompt_template", "render_prompt"]
+__all__ = ["get_prompt_template", "preload_prompts", "render_prompt"]
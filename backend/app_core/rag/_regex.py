@@ -0,0 +1,17 @@
+# backend/app_core/rag/_regex.py
+# Общий движок регулярок для HTML-парсеров: google-re2, если установлен, иначе stdlib re.
+import re
+
+try:  # pragma: no cover - optional dependency
+    import re2 as _re_engine  # type: ignore
+except Exception:  # noqa: S110 - fallback to stdlib re
+    _re_engine = re
+
+# в RE2 \s — только ASCII-пробелы, а в тексте со страниц полно неразрывных;
+# добавляем их явно, чтобы оба движка вели себя одинаково
+WS_CLASS = "[\\s\u00a0\u2007\u202f]"
+
+def rx(pattern: str, ignore_case: bool = False):
+    # флаги задаём inline: google-re2 не принимает re.I вторым аргументом
+    pattern = pattern.replace(r"\s", WS_CLASS)
+    return _re_engine.compile(("(?i)" + pattern) if ignore_case else pattern)
@@ -1,23 +1,25 @@
-try:  # pragma: no cover - optional dependency
-    from sentence_transformers import SentenceTransformer  # type: ignore
-except Exception:  # noqa: S110
-    SentenceTransformer = None  # type: ignore
+import sqlite3
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
 
 from ..config import settings
-from ..utils import pick_device_auto
+from ..utils import pick_device_auto, text_hash
 
-try:  # pragma: no cover
-    import torch  # type: ignore
-except Exception:  # noqa: S110
-    torch = None
+if TYPE_CHECKING:  # pragma: no cover
+    from sentence_transformers import SentenceTransformer  # type: ignore
 
 _embedder = None
 
-def get_embedder() -> SentenceTransformer:
+def get_embedder() -> "SentenceTransformer":
     global _embedder
-    if SentenceTransformer is None:
-        raise RuntimeError("sentence-transformers is not installed")
     if _embedder is None:
+        # sentence-transformers (и torch) импортируем только при первом обращении
+        try:
+            from sentence_transformers import SentenceTransformer  # type: ignore
+        except Exception as exc:  # noqa: S110
+            raise RuntimeError("sentence-transformers is not installed") from exc
         dev = pick_device_auto(settings.EMBED_DEVICE)
         try:
             _embedder = SentenceTransformer(settings.EMBEDDING_MODEL, device=dev)
@@ -26,3 +28,93 @@ def get_embedder() -> SentenceTransformer:
             print(f"[RAG] GPU init failed ({e}); fallback to CPU")
             _embedder = SentenceTransformer(settings.EMBEDDING_MODEL, device="cpu")
     return _embedder
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """L2-нормированные эмбеддинги всей пачки текстов одним вызовом encode.
+
+    Нормировка выполняется внутри encode (векторно, на устройстве модели);
+    результат — float32-матрица, в list она превращается только при отправке в Qdrant.
+    """
+    emb = get_embedder()
+    vecs = emb.encode(
+        texts,
+        batch_size=settings.EMBED_BATCH,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    # encode уже отдаёт float32 — asarray тогда не копирует
+    return np.asarray(vecs, dtype=np.float32)
+
+
+# sqlite ограничивает число параметров в запросе — IN (...) режем на пачки
+_CACHE_LOOKUP_CHUNK = 500
+
+def _open_embed_cache() -> Optional[sqlite3.Connection]:
+    path = settings.EMBED_CACHE
+    if not path:
+        return None
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS emb ("
+            "model TEXT NOT NULL, h TEXT NOT NULL, vec BLOB NOT NULL, "
+            "PRIMARY KEY (model, h))"
+        )
+        return conn
+    except (OSError, sqlite3.Error) as e:
+        print(f"[RAG] embedding cache disabled: {e}")
+        return None
+
+
+def embed_texts_cached(texts: List[str], hashes: Optional[List[str]] = None) -> np.ndarray:
+    """То же, что embed_texts, но с sqlite-кэшем векторов по (модель, text_hash).
+
+    Кодируются только тексты, которых ещё нет в кэше (и каждый — один раз за вызов);
+    новые векторы дописываются в кэш. Недоступный кэш не мешает ингесту.
+    hashes — уже посчитанные text_hash(texts), если они есть у вызывающего.
+    """
+    if not texts:
+        return embed_texts(texts)
+    conn = _open_embed_cache()
+    if conn is None:
+        return embed_texts(texts)
+
+    model = settings.EMBEDDING_MODEL
+    if hashes is None:
+        hashes = [text_hash(t) for t in texts]
+    found: Dict[str, np.ndarray] = {}
+    try:
+        try:
+            uniq = list(dict.fromkeys(hashes))
+            for i in range(0, len(uniq), _CACHE_LOOKUP_CHUNK):
+                part = uniq[i:i + _CACHE_LOOKUP_CHUNK]
+                q = "SELECT h, vec FROM emb WHERE model = ? AND h IN (%s)" % ",".join("?" * len(part))
+                for h, blob in conn.execute(q, (model, *part)):
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as e:
+            print(f"[RAG] embedding cache lookup failed: {e}")
+            found.clear()
+
+        missing: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        if missing:
+            vecs = embed_texts(list(missing.values()))
+            for h, v in zip(missing, vecs):
+                found[h] = v
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO emb (model, h, vec) VALUES (?, ?, ?)",
+                        [(model, h, found[h].tobytes()) for h in missing],
+                    )
+            except sqlite3.Error as e:
+                print(f"[RAG] embedding cache write failed: {e}")
+    finally:
+        conn.close()
+
+    return np.stack([found[h] for h in hashes])
@@ -5,18 +5,23 @@ from typing import List, Optional, Tuple
 from pathlib import Path
 from ..types import IngestItem
 
-# Заголовки
-RX_CHAPTER = re.compile(r"^\s*Глава\s+(\d+)\.?\s*(.*)$", re.I)
-RX_PARAGRAPH = re.compile(r"^\s*§\s*([0-9]+)\.?\s*(.*)$", re.I)
-RX_ARTICLE = re.compile(r"^\s*Статья\s+([0-9]+(?:\.[0-9]+)?)\s*[:.\-–—]?\s*(.*)$", re.I)
+# Заголовки. Строки приходят уже без краевых пробелов, поэтому шаблоны без якорей
+# и вызываются через fullmatch. Вместо re.I перечисляем реально встречающиеся
+# написания ключевого слова — без регистронезависимого сравнения по всему Unicode.
+RX_CHAPTER = re.compile(r"(?:Глава|ГЛАВА|глава)\s+([0-9]+)\.?\s*(.*)")
+RX_PARAGRAPH = re.compile(r"§\s*([0-9]+)\.?\s*(.*)")
+RX_ARTICLE = re.compile(r"(?:Статья|СТАТЬЯ|статья)\s+([0-9]+(?:\.[0-9]+)?)\s*[:.\-–—]?\s*(.*)")
 
-# Нумерованные пункты (1., 1), 1.1., 2.3.4. и т.п.)
-RX_POINT = re.compile(r"^\s*((?:\d+\.)+\d+|\d+)\s*[).]\s+(.*)$")
-RX_POINT_DOT = re.compile(r"^\s*((?:\d+\.)+\d+|\d+)\.\s+(.*)$")
+# Нумерованные пункты (1., 1), 1.1., 2.3.4. и т.п.) — одна альтернатива на оба вида.
+# Цифры только ASCII; re.ASCII не ставим, чтобы \s по-прежнему ловил неразрывный пробел
+RX_POINT = re.compile(r"((?:[0-9]+\.)+[0-9]+|[0-9]+)\s*[).]\s+(.*)")
 
 def _norm_text(s: str) -> str:
     # нормализуем переносы/пробелы
-    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    # str.translate тут не годится: на кириллице он в десятки раз медленнее replace;
+    # а для файлов с LF обе замены можно пропустить
+    if "\r" in s:
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
     # убираем BOM, если вдруг
     s = s.lstrip("\ufeff")
     return s
@@ -49,21 +54,21 @@ def parse_gk_text(
     buf: List[str] = []
     out: List[IngestItem] = []
 
-    def local_ref() -> str:
-        parts = [f"gkrf/p{part_no}"]
-        if chapter_no: parts.append(f"gl{chapter_no}")
-        if paragraph_no: parts.append(f"par{paragraph_no}")
-        if article_no: parts.append(f"art{article_no}")
-        if point_no: parts.append(f"pt{point_no}")
-        return "/".join(parts)
+    # local_ref собираем из готовых сегментов и пересчитываем только при смене
+    # главы/параграфа/статьи/пункта, а не на каждой записи
+    ref_base = f"gkrf/p{part_no}"
+    chap_seg = par_seg = art_seg = pt_seg = ""
+    ref = ref_base
+
+    emit = out.append
 
     def flush():
-        nonlocal buf, out
+        # buf очищаем на месте — без nonlocal-перепривязки списков
         if not buf: return
-        body = "\n".join([b for b in (x.strip() for x in buf) if b]).strip()
-        if not body:
-            buf = []; return
-        out.append(IngestItem(
+        # в buf только непустые строки, уже очищенные от пробелов
+        body = "\n".join(buf)
+        buf.clear()
+        emit(IngestItem(
             act_id=act_id,
             act_title=title,
             article=article_no,
@@ -72,55 +77,68 @@ def parse_gk_text(
             revision_date=revision_date,
             jurisdiction="RU",
             text=body,
-            local_ref=local_ref()
+            local_ref=ref
         ))
-        buf = []
 
     for raw in lines:
         ln = raw.strip()
 
-        # Пустые строки — как разделители (накапливаем один перенос)
+        # Пустые строки в тело записи не попадают
         if not ln:
-            if buf and buf[-1] != "":
-                buf.append("")
-            continue
-
-        # Заголовки верхнего уровня
-        m = RX_CHAPTER.match(ln)
-        if m:
-            flush()
-            chapter_no = m.group(1)
-            paragraph_no = None  # сбрасываем параграф при смене главы
-            # сам заголовок главы не пишем в контент — метаданные хватит
             continue
 
-        m = RX_PARAGRAPH.match(ln)
-        if m:
-            flush()
-            paragraph_no = m.group(1)
-            continue
+        # Регулярки запускаем только для строк с подходящим первым символом:
+        # основная масса строк — обычный текст статьи
+        head = ln[0]
 
-        m = RX_ARTICLE.match(ln)
-        if m:
-            # новая статья → сбросить предыдущие
-            flush()
-            article_no = m.group(1)
-            point_no = None
-            # хвост после заголовка статьи — если есть, написать как текст
-            tail = m.group(2).strip()
-            if tail:
-                buf.append(tail)
-            continue
+        # Заголовки верхнего уровня
+        if head in "Гг":
+            m = RX_CHAPTER.fullmatch(ln)
+            if m:
+                flush()
+                chapter_no = m.group(1)
+                paragraph_no = None  # сбрасываем параграф при смене главы
+                chap_seg, par_seg = f"/gl{chapter_no}", ""
+                ref = "".join((ref_base, chap_seg, art_seg, pt_seg))
+                # сам заголовок главы не пишем в контент — метаданные хватит
+                continue
+
+        elif head == "§":
+            m = RX_PARAGRAPH.fullmatch(ln)
+            if m:
+                flush()
+                paragraph_no = m.group(1)
+                par_seg = f"/par{paragraph_no}"
+                ref = "".join((ref_base, chap_seg, par_seg, art_seg, pt_seg))
+                continue
+
+        elif head in "Сс":
+            m = RX_ARTICLE.fullmatch(ln)
+            if m:
+                # новая статья → сбросить предыдущие
+                flush()
+                article_no = m.group(1)
+                point_no = None
+                art_seg, pt_seg = f"/art{article_no}", ""
+                ref = "".join((ref_base, chap_seg, par_seg, art_seg))
+                # хвост после заголовка статьи — если есть, написать как текст
+                tail = m.group(2).strip()
+                if tail:
+                    buf.append(tail)
+                continue
 
         # Пункты: 1., 1), 1.1., 2.3) и т.п.
-        m = RX_POINT.match(ln) or RX_POINT_DOT.match(ln)
-        if m and article_no:
-            flush()
-            point_no = m.group(1)
-            tail = m.group(2).strip() if m.lastindex and m.lastindex >= 2 else ""
-            if tail:
-                buf.append(tail)
-            continue
+        elif head.isdigit():
+            m = RX_POINT.fullmatch(ln)
+            if m and article_no:
+                flush()
+                point_no = m.group(1)
+                pt_seg = f"/pt{point_no}"
+                ref = "".join((ref_base, chap_seg, par_seg, art_seg, pt_seg))
+                tail = m.group(2).strip() if m.lastindex and m.lastindex >= 2 else ""
+                if tail:
+                    buf.append(tail)
+                continue
 
         # Иначе — обычный текст
         buf.append(ln)
@@ -129,13 +147,28 @@ def parse_gk_text(
     return out
 
 def parse_gk_file(path: Path, part_no: int, act_title: Optional[str], revision_date: Optional[str]) -> List[IngestItem]:
-    encodings = ("utf-8", "cp1251")
-    last_err = None
-    for enc in encodings:
+    # читаем файл один раз, кодировку подбираем уже в памяти
+    try:
+        raw = path.read_bytes().removeprefix(b"\xef\xbb\xbf")
+    except OSError as e:
+        raise RuntimeError(f"cannot read {path}: {e}") from e
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
         try:
-            text = path.read_text(encoding=enc)
-            return parse_gk_text(text, part_no=part_no, act_title=act_title, revision_date=revision_date)
-        except Exception as e:
-            last_err = e
-            continue
-    raise RuntimeError(f"cannot read {path}: {last_err}")
+            text = raw.decode("cp1251")
+        except UnicodeDecodeError as e:
+            raise RuntimeError(f"cannot read {path}: {e}") from e
+    return parse_gk_text(text, part_no=part_no, act_title=act_title, revision_date=revision_date)
+
+def parse_gk_file_job(job: tuple) -> Tuple[List[IngestItem], Optional[str]]:
+    """(path, part_no, act_title, revision_date) -> (items, error).
+
+    Точка входа для пула процессов: живёт здесь, чтобы дочернему процессу
+    хватало импорта парсера, без роутов, torch и клиентов Qdrant.
+    """
+    p, part_no, title, revision_date = job
+    try:
+        return parse_gk_file(p, part_no=part_no or 0, act_title=title, revision_date=revision_date), None
+    except Exception as e:
+        return [], str(e)
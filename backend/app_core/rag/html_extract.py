@@ -1,49 +1,106 @@
-from selectolax.parser import HTMLParser
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
 from typing import List, Tuple, Optional
-import re
+
+from ._regex import rx as _rx
+
+_RX_WS = _rx(r"\s+")
+_RX_TRAIL = _rx(r"[ \t]+\n")
+_RX_MULTI_NL = _rx(r"\n{3,}")
+_RX_PARA = _rx(r"\n{2,}")
+
+# один css-запрос со списком селекторов — один обход дерева вместо шести
+_NOISE_SELECTOR = "script,style,noscript,template,iframe,svg"
 
 def _clean_tree(tree: HTMLParser) -> None:
-    for css in ["script", "style", "noscript", "template", "iframe", "svg"]:
-        for n in tree.css(css):
-            n.decompose()
+    # с конца: вложенные совпадения (style внутри svg) удаляются раньше предка
+    for n in reversed(tree.css(_NOISE_SELECTOR)):
+        n.decompose()
 
 def _get_title(tree: HTMLParser) -> str:
     t = tree.css_first("title")
     if not t:
         return ""
     title = t.text(strip=True)
-    title = re.sub(r"\s+", " ", title).strip()
+    title = _RX_WS.sub(" ", title).strip()
     return title[:300]
 
+# кандидаты на «основной» контейнер; ранг = позиция в прежнем списке селекторов
+# (при равной длине текста выигрывает меньший ранг)
+_MAIN_TAG_RANK = {"article": 0, "main": 1, "body": 9}
+_MAIN_CLASS_RANK = {"content": 3, "content__inner": 4, "page-content": 5,
+                    "document": 6, "doc": 7, "law": 8}
+
+_BLOCK_TAGS = frozenset(("h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote"))
+_HEADING_TAGS = frozenset(("h1", "h2", "h3", "h4", "h5", "h6"))
+
+def _main_rank(n) -> Optional[int]:
+    ranks = []
+    tag_rank = _MAIN_TAG_RANK.get(n.tag)
+    if tag_rank is not None:
+        ranks.append(tag_rank)
+    attrs = n.attributes
+    if attrs.get("role") == "main":
+        ranks.append(2)
+    cls = attrs.get("class")
+    if cls:
+        ranks.extend(_MAIN_CLASS_RANK[c] for c in cls.split() if c in _MAIN_CLASS_RANK)
+    return min(ranks) if ranks else None
+
 def _pick_main(tree: HTMLParser):
-    # эвристика: берём самый “текстонасыщенный” контейнер
-    candidates = []
-    for sel in ["article", "main", '[role="main"]',
-                ".content", ".content__inner", ".page-content",
-                ".document", ".doc", ".law", "body"]:
-        for n in tree.css(sel):
-            txt = n.text(separator="\n", strip=True)
-            candidates.append((len(txt), n))
-    if not candidates:
+    # эвристика: берём самый “текстонасыщенный” контейнер.
+    # Кандидатов ищем одним обходом дерева вместо прохода на каждый селектор;
+    # текст меряем только у тех, кто может победить: вложенный кандидат не
+    # длиннее объемлющего и выигрывает лишь при лучшем ранге.
+    root = tree.root
+    if root is None:
         return tree.body or tree
-    return sorted(candidates, key=lambda x: x[0], reverse=True)[0][1]
+    ranks = {}
+    best = None  # ((-len, rank, order), node)
+    for order, n in enumerate(root.traverse(include_text=False)):
+        rank = _main_rank(n)
+        if rank is None:
+            continue
+        ranks[n.mem_id] = rank
+        p = n.parent
+        shadowed = False
+        while p is not None:
+            outer = ranks.get(p.mem_id)
+            if outer is not None and outer <= rank:
+                shadowed = True
+                break
+            p = p.parent
+        if shadowed:
+            continue
+        size = len(n.text(separator="\n", strip=True))
+        key = (-size, rank, order)
+        if best is None or key < best[0]:
+            best = (key, n)
+    if best is None:
+        return tree.body or tree
+    return best[1]
 
 def _node_to_text(n) -> str:
-    # собираем параграфы/списки/заголовки с перевodами строк
+    # собираем параграфы/списки/заголовки с перевodами строк — одним обходом поддерева
+    root = n.root if isinstance(n, HTMLParser) else n
+    if root is None:
+        return ""
     parts: List[str] = []
-    for el in n.css("h1,h2,h3,h4,h5,h6,p,li,pre,blockquote"):
+    for el in root.traverse(include_text=False):
+        tag = el.tag
+        if tag not in _BLOCK_TAGS:
+            continue
         t = el.text(separator=" ", strip=True)
-        t = re.sub(r"\s+", " ", t)
+        t = _RX_WS.sub(" ", t)
         if not t:
             continue
         # лёгкая заметка заголовков
-        if el.tag in ("h1","h2","h3","h4","h5","h6"):
+        if tag in _HEADING_TAGS:
             t = f"\n{t}\n"
         parts.append(t)
     text = "\n".join(parts)
     # общее подчистить
-    text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    text = _RX_TRAIL.sub("\n", text)
+    text = _RX_MULTI_NL.sub("\n\n", text).strip()
     return text
 
 def html_to_text(html: str) -> Tuple[str, str]:
@@ -58,7 +115,7 @@ def split_into_chunks(text: str, max_chars: int = 1800, overlap: int = 120) -> L
     if len(text) <= max_chars:
         return [text]
     # режем по абзацам/пустым строкам
-    paras = re.split(r"\n{2,}", text)
+    paras = _RX_PARA.split(text)
     chunks: List[str] = []
     cur: List[str] = []
     cur_len = 0
@@ -71,8 +128,12 @@ def split_into_chunks(text: str, max_chars: int = 1800, overlap: int = 120) -> L
             # оверлап — берём хвост прошлого чанка
             tail = chunks[-1]
             tail_tail = tail[-overlap:]
-            cur = [tail_tail, p] if overlap > 0 else [p]
-            cur_len = sum(len(x) for x in cur) + 2
+            if overlap > 0:
+                cur = [tail_tail, p]
+                cur_len = len(tail_tail) + len(p) + 2
+            else:
+                cur = [p]
+                cur_len = len(p) + 2
         else:
             cur.append(p)
             cur_len += len(p) + 2
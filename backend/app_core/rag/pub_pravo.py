@@ -1,28 +1,67 @@
 from __future__ import annotations
-from selectolax.parser import HTMLParser
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
 from typing import List, Tuple, Optional
-import re, hashlib
+import hashlib
+from operator import itemgetter
 from urllib.parse import urlparse
 
 from ..types import IngestItem
+from ._regex import rx as _rx
 
-RX_ART = re.compile(r"^\s*(Статья|Ст.\s*)\s*([0-9]+(?:\.[0-9]+)?)\s*\.?\s*(.*)$", re.I)
-RX_PART = re.compile(r"^\s*(Часть|Ч\.)\s*([0-9]+)\s*\.?\s*(.*)$", re.I)
-RX_POINT = re.compile(r"^\s*(Пункт|П\.)\s*([0-9]+)\s*\.?\s*(.*)$", re.I)
+RX_ART = _rx(r"^\s*(Статья|Ст.\s*)\s*([0-9]+(?:\.[0-9]+)?)\s*\.?\s*(.*)$", ignore_case=True)
+RX_PART = _rx(r"^\s*(Часть|Ч\.)\s*([0-9]+)\s*\.?\s*(.*)$", ignore_case=True)
+RX_POINT = _rx(r"^\s*(Пункт|П\.)\s*([0-9]+)\s*\.?\s*(.*)$", ignore_case=True)
 
-RX_DATE_META = re.compile(r"(\d{4}-\d{2}-\d{2})")
-RX_DATE_DMY = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
-RX_EDIT = re.compile(r"(редакц(ия|ии)\s*от\s*(\d{1,2}\.\d{1,2}\.\d{4}))", re.I)
+RX_DATE_META = _rx(r"(\d{4}-\d{2}-\d{2})")
+RX_DATE_DMY = _rx(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+RX_EDIT = _rx(r"(редакц(ия|ии)\s*от\s*(\d{1,2}\.\d{1,2}\.\d{4}))", ignore_case=True)
+
+RX_WS = _rx(r"\s+")
+RX_PARA = _rx(r"\n{2,}")
 
 BLOCK_SELECTOR = "h1,h2,h3,h4,h5,h6,p,li,blockquote,pre"
+BLOCK_TAGS = frozenset(BLOCK_SELECTOR.split(","))
+HEADING_TAGS = frozenset(("h1","h2","h3","h4","h5","h6"))
+
+NOISE_SELECTOR = "script,style,noscript,template,iframe,svg"
 
 def _clean_tree(tree: HTMLParser) -> None:
-    for css in ["script","style","noscript","template","iframe","svg"]:
-        for n in tree.css(css): n.decompose()
+    # один обход дерева на все «шумовые» теги; с конца — чтобы вложенные
+    # совпадения удалялись раньше своего предка
+    for n in reversed(tree.css(NOISE_SELECTOR)): n.decompose()
+
+# дата редакции стоит в шапке публикации — дальше первых килобайт не ищем
+REVISION_SCAN_CHARS = 4096
+# для выбора основного контейнера хватает грубой оценки размера
+MAIN_SIZE_CAP = 50_000
+
+def _walk_root(node):
+    # _pick_main может вернуть сам парсер (нет <body>) — тогда обходим от корня
+    return node.root if isinstance(node, HTMLParser) else node
+
+def _head_text(node, limit: int = REVISION_SCAN_CHARS) -> str:
+    """Начало текста узла (как text(separator=" ", strip=True)) — обход обрывается,
+    как только набрано limit символов, полный текст документа не собирается."""
+    root = _walk_root(node)
+    if root is None:
+        return ""
+    parts: List[str] = []
+    total = 0
+    for n in root.traverse(include_text=True):
+        if n.tag != "-text":
+            continue
+        t = n.text(deep=False).strip()
+        if not t:
+            continue
+        parts.append(t)
+        total += len(t) + 1
+        if total >= limit:
+            break
+    return " ".join(parts)
 
 def _text(node) -> str:
     t = node.text(separator=" ", strip=True)
-    t = re.sub(r"\s+", " ", t).strip()
+    t = RX_WS.sub(" ", t).strip()
     return t
 
 def _pick_main(tree: HTMLParser):
@@ -36,10 +75,11 @@ def _pick_main(tree: HTMLParser):
     cand = []
     for sel in selectors:
         for n in tree.css(sel):
-            size = len(n.text(separator=" ", strip=True))
+            # размер с потолком: у крупных кандидатов ничья, и решает порядок селекторов
+            size = min(len(_head_text(n, MAIN_SIZE_CAP)), MAIN_SIZE_CAP)
             cand.append((size, n))
-    cand.sort(key=lambda x: x[0], reverse=True)
-    return cand[0][1] if cand else (tree.body or tree)
+    # max отдаёт первый из равных — как и прежняя стабильная сортировка по убыванию
+    return max(cand, key=itemgetter(0))[1] if cand else (tree.body or tree)
 
 def _title(tree: HTMLParser, main) -> str:
     # 1) <title>
@@ -67,22 +107,20 @@ def _extract_revision(tree: HTMLParser, main) -> Optional[str]:
         c = m.attributes.get("content","")
         m2 = RX_DATE_META.search(c)
         if m2: return m2.group(1)
-    # поиск «редакция от DD.MM.YYYY» в тексте
-    txt = main.text(separator=" ", strip=True)
+    # поиск «редакция от DD.MM.YYYY» в начале текста
+    txt = _head_text(main)
     m3 = RX_EDIT.search(txt) or RX_DATE_DMY.search(txt)
     if m3:
-        dd, mm, yyyy = None, None, None
-        if len(m3.groups()) >= 3 and m3.re is RX_EDIT or m3.re is RX_DATE_DMY:
-            # обе регулярки отдают dd.mm.yyyy где-то в группах
-            g = m3.groups()[-3:]  # dd, mm, yyyy
-            dd, mm, yyyy = g
-            dd = dd.zfill(2); mm = mm.zfill(2)
-            return f"{yyyy}-{mm}-{dd}"
+        # обе регулярки отдают dd.mm.yyyy где-то в группах
+        # (проверка m3.re была истинна всегда; без неё не зависим от API совпадений движка)
+        dd, mm, yyyy = m3.groups()[-3:]
+        dd = dd.zfill(2); mm = mm.zfill(2)
+        return f"{yyyy}-{mm}-{dd}"
     return None
 
 def _act_id_from_url(base_url: str) -> str:
-    # стабильный ID по URL (короткий sha1)
-    h = hashlib.sha1(base_url.encode("utf-8")).hexdigest()[:12]
+    # стабильный ID по URL: blake2b сразу с 6-байтным дайджестом (12 hex), без обрезки
+    h = hashlib.blake2b(base_url.encode("utf-8"), digest_size=6).hexdigest()
     return f"pravo_pub:{h}"
 
 def _local_ref(base_url: str, art: Optional[str], part: Optional[str], point: Optional[str]) -> str:
@@ -132,13 +170,19 @@ def parse_publication_html(html: str, base_url: str) -> Tuple[str, Optional[str]
         ))
         buf = []
 
-    for el in main.css(BLOCK_SELECTOR):
+    # блоки собираем одним обходом поддерева вместо css-поиска по селектору
+    walk_root = _walk_root(main)
+    blocks = walk_root.traverse(include_text=False) if walk_root is not None else ()
+    for el in blocks:
+        tag = el.tag
+        if tag not in BLOCK_TAGS:
+            continue
         t = _text(el)
         if not t:
             continue
 
         # Заголовки могут переключать уровни
-        if el.tag in ("h1","h2","h3","h4","h5","h6"):
+        if tag in HEADING_TAGS:
             m = RX_ART.match(t)
             if m:
                 flush()
@@ -214,7 +258,7 @@ def parse_publication_html(html: str, base_url: str) -> Tuple[str, Optional[str]
 def _chunks_fallback(text: str, max_chars: int = 1800, overlap: int = 120) -> List[str]:
     if len(text) <= max_chars:
         return [text]
-    paras = re.split(r"\n{2,}", text)
+    paras = RX_PARA.split(text)
     out, cur = [], []
     cur_len = 0
     for p in paras:
@@ -224,7 +268,7 @@ def _chunks_fallback(text: str, max_chars: int = 1800, overlap: int = 120) -> Li
             out.append("\n\n".join(cur))
             tail = out[-1][-overlap:] if overlap > 0 else ""
             cur = [tail, p] if tail else [p]
-            cur_len = sum(len(x) for x in cur) + 2
+            cur_len = len(tail) + len(p) + 2
         else:
             cur.append(p)
             cur_len += len(p) + 2
@@ -1,20 +1,39 @@
-import json, os, numpy as np
-from typing import List
+import json, os
+from pathlib import Path
+from typing import List, Union
+
+try:  # pragma: no cover - optional dependency
+    import orjson  # type: ignore
+    _json_loads = orjson.loads
+except Exception:  # noqa: S110 - fallback to stdlib json
+    _json_loads = json.loads
 
 try:  # pragma: no cover - optional dependency
     from qdrant_client import QdrantClient  # type: ignore
-    from qdrant_client.models import VectorParams, Distance, PointStruct, Filter, FieldCondition, MatchValue
+    from qdrant_client.models import VectorParams, Distance, Filter, FieldCondition, MatchValue
+    from qdrant_client.models import ScalarQuantization, ScalarQuantizationConfig, ScalarType
+    from qdrant_client.models import HnswConfigDiff, SearchParams, QuantizationSearchParams
 except Exception:  # noqa: S110
     QdrantClient = None  # type: ignore
-    VectorParams = Distance = PointStruct = Filter = FieldCondition = MatchValue = None  # type: ignore
+    VectorParams = Distance = Filter = FieldCondition = MatchValue = None  # type: ignore
+    ScalarQuantization = ScalarQuantizationConfig = ScalarType = None  # type: ignore
+    HnswConfigDiff = SearchParams = QuantizationSearchParams = None  # type: ignore
 
-from .embedder import get_embedder
+from .embedder import embed_texts, embed_texts_cached
 from ..types import IngestItem, SourceItem
 from ..config import settings
 from ..utils import deterministic_point_id, text_hash
 
 _qdrant = None
 
+# HNSW: граф плотнее стандартного (ef_construct 100 -> 200) — выше recall при том же m;
+# при поиске ef берём с запасом от top_k, а int8-кандидатов пересчитываем по оригиналам
+_HNSW_M = 16
+_HNSW_EF_CONSTRUCT = 200
+_HNSW_EF_PER_K = 16
+_HNSW_EF_MIN = 128
+_RESCORE_OVERSAMPLING = 2.0
+
 def _require_qdrant() -> None:
     if QdrantClient is None:
         raise RuntimeError("qdrant-client is not installed")
@@ -24,51 +43,83 @@ def get_qdrant() -> QdrantClient:
     _require_qdrant()
     global _qdrant
     if _qdrant is None:
-        _qdrant = QdrantClient(url=settings.QDRANT_URL, timeout=2.0)
+        # один долгоживущий клиент; по gRPC векторы идут protobuf-ом, а не JSON
+        _qdrant = QdrantClient(
+            url=settings.QDRANT_URL,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            timeout=2.0,
+        )
     return _qdrant
 
 def ensure_collection():
     client = get_qdrant()
     names = [c.name for c in client.get_collections().collections]
     if settings.QDRANT_COLLECTION not in names:
+        # int8-квантизация: поиск идёт по сжатым векторам в RAM (в 4 раза меньше float32),
+        # оригиналы остаются в хранилище для пересчёта скоров
+        quantization = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+        hnsw = HnswConfigDiff(m=_HNSW_M, ef_construct=_HNSW_EF_CONSTRUCT)
         try:
             client.create_collection(
                 collection_name=settings.QDRANT_COLLECTION,
                 vectors=VectorParams(size=1024, distance=Distance.COSINE),
+                hnsw_config=hnsw,
+                quantization_config=quantization,
             )
         except AssertionError:
             client.create_collection(
                 collection_name=settings.QDRANT_COLLECTION,
                 vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
+                hnsw_config=hnsw,
+                quantization_config=quantization,
             )
 
 def ingest_items(items: List[IngestItem]):
     _require_qdrant()
-    emb = get_embedder()
     client = get_qdrant()
+    if not items:
+        return {"ingested": 0, "collection": settings.QDRANT_COLLECTION}
     texts = [it.text for it in items]
-    vecs = emb.encode(texts, normalize_embeddings=True)
-    vectors = [np.asarray(v, dtype=np.float32).tolist() for v in vecs]
-    points = []
-    for i, it in enumerate(items):
-        payload = it.dict()
-        payload["source_hash"] = text_hash(it.text)
-        key = it.local_ref or it.text
-        pid = deterministic_point_id(key)
-        points.append(PointStruct(id=pid, vector=vectors[i], payload=payload))
-    client.upsert(collection_name=settings.QDRANT_COLLECTION, points=points)
-    return {"ingested": len(points), "collection": settings.QDRANT_COLLECTION}
+    # text_hash считаем один раз: он и ключ кэша эмбеддингов, и source_hash в payload
+    hashes = [text_hash(t) for t in texts]
+    # при повторном ингесте уже посчитанные векторы берём из кэша
+    vecs = embed_texts_cached(texts, hashes)
+    payloads, ids = [], []
+    for it, h in zip(items, hashes):
+        payload = it.model_dump()
+        payload["source_hash"] = h
+        payloads.append(payload)
+        ids.append(deterministic_point_id(it.local_ref or it.text))
+    # float32-матрица уходит в клиент целиком, без PointStruct и списков на каждый вектор
+    client.upload_collection(
+        collection_name=settings.QDRANT_COLLECTION,
+        vectors=vecs,
+        payload=payloads,
+        ids=ids,
+        batch_size=256,
+        wait=True,
+    )
+    return {"ingested": len(ids), "collection": settings.QDRANT_COLLECTION}
 
 def rag_search_ru(query: str, top_k: int = 8) -> List[SourceItem]:
     try:
         ensure_collection()
     except RuntimeError:
         return []
-    emb = get_embedder()
     client = get_qdrant()
-    qv = emb.encode([query], normalize_embeddings=True)[0].astype(np.float32).tolist()
+    qv = embed_texts([query])[0].tolist()
     flt = Filter(must=[FieldCondition(key="jurisdiction", match=MatchValue(value="RU"))])
-    res = client.search(collection_name=settings.QDRANT_COLLECTION, query_vector=qv, limit=top_k, query_filter=flt)
+    params = SearchParams(
+        hnsw_ef=max(_HNSW_EF_MIN, top_k * _HNSW_EF_PER_K),
+        quantization=QuantizationSearchParams(rescore=True, oversampling=_RESCORE_OVERSAMPLING),
+    )
+    res = client.search(
+        collection_name=settings.QDRANT_COLLECTION, query_vector=qv, limit=top_k,
+        query_filter=flt, search_params=params,
+    )
     out: List[SourceItem] = []
     for r in res:
         p = r.payload or {}
@@ -80,16 +131,19 @@ def rag_search_ru(query: str, top_k: int = 8) -> List[SourceItem]:
         ))
     return out
 
+def load_jsonl_items(path: Union[str, Path]) -> List[IngestItem]:
+    # файл небольшой: читаем целиком байтами, строки разбираем orjson-ом (если есть).
+    # Корпус свой и доверенный — валидацию pydantic пропускаем (model_construct)
+    items: List[IngestItem] = []
+    for line in Path(path).read_bytes().split(b"\n"):
+        if not line.strip():
+            continue
+        items.append(IngestItem.model_construct(**_json_loads(line)))
+    return items
+
 def ingest_sample_from_file():
     ensure_collection()
     path = "/workspace/corpus/ru_sample.jsonl"
     if not os.path.exists(path):
         raise FileNotFoundError("Файл corpus/ru_sample.jsonl не найден")
-    items: List[IngestItem] = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line: continue
-            data = json.loads(line)
-            items.append(IngestItem(**data))
-    return ingest_items(items)
+    return ingest_items(load_jsonl_items(path))
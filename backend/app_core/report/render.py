@@ -1,326 +1,207 @@
 # backend/app_core/report/render.py
 from __future__ import annotations
-from typing import Dict, Any, List
-from datetime import datetime
+from typing import Dict, Any, List, Tuple
 from pathlib import Path
+import os
 import re
-import html
-
-
-def _risk_badge(color: str) -> str:
-    color = (color or "").lower()
-    bg = {"green": "#16a34a", "yellow": "#ca8a04", "red": "#dc2626"}.get(color, "#64748b")
-    return f'style="display:inline-block;padding:4px 10px;border-radius:999px;background:{bg};color:#fff;font-weight:600;font-size:12px"'
-
-
-def _escape(s: Any) -> str:
-    return html.escape(str(s) if s is not None else "")
-
-
-def _section_rows(section_scores: List[Dict[str, Any]]) -> str:
-    rows = []
-    for s in section_scores or []:
-        pct = 0
-        try:
-            pct = int(round(100 * float(s.get("score", 0)) / float(s.get("of", 1))))
-        except Exception:
-            pct = 0
-        bar = f"""
-          <div style=\"background:#e5e7eb;height:8px;border-radius:6px;overflow:hidden\">
-            <div style=\"width:{pct}%;height:8px;background:#3b82f6\"></div>
-          </div>"""
-        rows.append(
-            f"""
-          <tr>
-            <td style=\"padding:8px 12px;border-bottom:1px solid #eee\">{_escape(s.get('title'))}</td>
-            <td style=\"padding:8px 12px;border-bottom:1px solid #eee;white-space:nowrap\">{_escape(s.get('score'))} / {_escape(s.get('of'))}</td>
-            <td style=\"padding:8px 12px;border-bottom:1px solid #eee\">{bar}</td>
-            <td style=\"padding:8px 12px;border-bottom:1px solid #eee;color:#6b7280\">{_escape(s.get('comment') or '')}</td>
-          </tr>"""
-        )
-    return "\n".join(rows)
-
-
-def _issues_list(issues: List[Dict[str, Any]]) -> str:
-    if not issues:
-        return '<p style="color:#6b7280">Явных критичных замечаний не выявлено.</p>'
-    items = []
-    for it in issues:
-        items.append(
-            f"""
-          <li style=\"margin-bottom:8px\">
-            <b>{_escape(it.get('section'))}</b>: {_escape(it.get('text'))}
-            <div style=\"color:#6b7280\"><i>Рекомендация:</i> {_escape(it.get('suggestion') or '')}</div>
-          </li>"""
+import time
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
+from pydantic import BaseModel
+
+
+# Шаблон отчёта компилируется один раз на процесс; байткод шаблона кешируется
+# на диске, чтобы новые воркеры не разбирали его заново. Экранирование — autoescape.
+_TEMPLATES_DIR = Path(__file__).with_name("templates")
+
+# допустимые символы в имени файла отчёта
+_SAFE_RE = re.compile(r"[^a-zA-Z0-9_.-]+")
+
+_OUTDIR = Path("/workspace/reports")
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC
+
+
+# готовые style-атрибуты бейджа: меняется только фон, строим их один раз
+_BADGE_STYLES = {
+    color: Markup(
+        f'style="display:inline-block;padding:4px 10px;border-radius:999px;background:{bg};'
+        'color:#fff;font-weight:600;font-size:12px"'
+    )
+    for color, bg in (("green", "#16a34a"), ("yellow", "#ca8a04"), ("red", "#dc2626"), ("", "#64748b"))
+}
+
+
+def _risk_badge(color: str) -> Markup:
+    return _BADGE_STYLES.get((color or "").lower(), _BADGE_STYLES[""])
+
+
+def _pct(s: Dict[str, Any]) -> int:
+    try:
+        return int(round(100 * float(s.get("score", 0)) / float(s.get("of", 1))))
+    except Exception:
+        return 0
+
+
+def _finalize(value: Any) -> Any:
+    # None в шаблоне выводим пустой строкой, как прежний _escape
+    return "" if value is None else value
+
+
+_ENV: Environment | None = None
+_TEMPLATE = None
+
+
+def _get_template():
+    # окружение и скомпилированный шаблон живут весь процесс: создаются при первом рендере
+    global _ENV, _TEMPLATE
+    if _TEMPLATE is None:
+        _ENV = Environment(
+            loader=FileSystemLoader(str(_TEMPLATES_DIR)),
+            autoescape=True,
+            auto_reload=False,
+            cache_size=64,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            finalize=_finalize,
+            bytecode_cache=FileSystemBytecodeCache(),
         )
-    return "<ul>" + "\n".join(items) + "</ul>"
-
-
-def _sources_list(sources: List[Dict[str, Any]]) -> str:
-    if not sources:
-        return '<p style="color:#6b7280">Источники не найдены.</p>'
-    li = []
-    for s in sources:
-        where = "ст." + _escape(s.get("article")) if s.get("article") else ""
-        if s.get("point"):
-            where += f", п.{_escape(s.get('point'))}"
-        ref = _escape(s.get("local_ref") or "")
-        li.append(f"<li><b>{_escape(s.get('act_title'))}</b> {where} <span style='color:#6b7280'>({ref})</span></li>")
-    return "<ol>" + "\n".join(li) + "</ol>"
-
-
-def _score_chip(title: str, color: str, score_text: str) -> str:
-    badge = f"<span {_risk_badge(color)}>{_escape(color or 'n/a')}</span>"
-    return f"""
-      <div style=\"flex:1;min-width:240px\">
-        <div style=\"font-size:13px;color:#6b7280;margin-bottom:4px\">{_escape(title)}</div>
-        <div style=\"display:flex;align-items:center;gap:12px\">
-          {badge}
-          <span style=\"font-size:20px;font-weight:600\">{_escape(score_text or '—')}</span>
-        </div>
-      </div>"""
+        _ENV.filters["risk_badge"] = _risk_badge
+        _ENV.filters["pct"] = _pct
+        _TEMPLATE = _ENV.get_template("report.html.j2")
+    return _TEMPLATE
 
 
 def _normalize_items(items: List[Any]) -> List[Dict[str, Any]]:
     result: List[Dict[str, Any]] = []
+    append = result.append
     for it in items or []:
-        if hasattr(it, "dict"):
-            try:
-                result.append(it.dict())  # type: ignore[attr-defined]
-                continue
-            except Exception:
-                pass
-        if isinstance(it, dict):
-            result.append(it)
+        if isinstance(it, BaseModel):
+            append(it.model_dump())
+        elif isinstance(it, dict):
+            append(it)
     return result
 
 
 def _normalize_dict(item: Any) -> Dict[str, Any]:
-    if hasattr(item, "dict"):
-        try:
-            return item.dict()  # type: ignore[attr-defined]
-        except Exception:
-            pass
+    if isinstance(item, BaseModel):
+        return item.model_dump()
     if isinstance(item, dict):
         return item
     return {}
 
 
-def _bullet_list(items: List[Any], empty_text: str) -> str:
-    values: List[str] = []
-    for raw in items or []:
-        text = str(raw).strip()
-        if text:
-            values.append(text)
-    if not values:
-        return f'<p style="color:#6b7280">{_escape(empty_text)}</p>'
-    lis = [f"<li>{_escape(text)}</li>" for text in values]
-    return "<ul>" + "\n".join(lis) + "</ul>"
-
-
-def _focus_list(top_focus: List[Dict[str, Any]]) -> str:
-    items = []
-    for f in _normalize_items(top_focus)[:5]:
-        title = f.get("title") or f.get("key")
-        why = f.get("why") or ""
-        suggestion = f.get("suggestion") or ""
-        extra = f" <i style='color:#6b7280'>({_escape(suggestion)})</i>" if suggestion else ""
-        items.append(
-            f"<li><b>{_escape(title)}</b> — {_escape(why)}{extra}</li>"
-        )
-    if not items:
-        return '<p style="color:#6b7280">—</p>'
-    return "<ul>" + "\n".join(items) + "</ul>"
+def _text_list(items: List[Any]) -> List[str]:
+    # один генератор вместо цикла с append
+    return [text for text in (str(raw).strip() for raw in items or []) if text]
 
 
-def render_html(meta: Dict[str, Any], analysis: Dict[str, Any]) -> str:
+# поля блока оценки и значения по умолчанию (кортежи — без аллокации пустых списков)
+_BLOCK_KEYS = (
+    ("score_text", ""),
+    ("risk_color", ""),
+    ("summary", ""),
+    ("focus_summary", ""),
+    ("top_focus", ()),
+    ("section_scores", ()),
+    ("issues", ()),
+)
+
+
+def _block(analysis: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    p = f"{prefix}_" if prefix else ""
+    return {key: analysis.get(p + key) or default for key, default in _BLOCK_KEYS}
+
+
+def _report_context(meta: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
     analysis = analysis or {}
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
 
-    def _block(prefix: str = "") -> Dict[str, Any]:
-        suffix = f"{prefix}_" if prefix else ""
+    def _card(title: str, block: Dict[str, Any], narrative: Dict[str, Any]) -> Dict[str, Any]:
+        summary = narrative.get("summary") or block.get("summary") or ""
         return {
-            "score_text": analysis.get(f"{suffix}score_text") or "",
-            "risk_color": analysis.get(f"{suffix}risk_color") or "",
-            "summary": analysis.get(f"{suffix}summary") or "",
-            "focus_summary": analysis.get(f"{suffix}focus_summary") or "",
-            "top_focus": analysis.get(f"{suffix}top_focus") or [],
-            "section_scores": analysis.get(f"{suffix}section_scores") or [],
-            "issues": analysis.get(f"{suffix}issues") or [],
+            **block,
+            "title": title,
+            "summary": summary,
+            "top_focus": _normalize_items(block["top_focus"])[:5],
+            "analysis_points": _text_list(narrative.get("analysis_points") or []),
+            "recommendations": _text_list(narrative.get("recommendations") or []),
+            "present": any([
+                block["score_text"],
+                summary,
+                block["section_scores"],
+                block["issues"],
+            ]),
         }
 
-    law_block = _block("")
-    business_block = _block("business")
+    law_block = _block(analysis)
+    business_block = _block(analysis, "business")
     sources = analysis.get("sources") or []
 
     overview_data = _normalize_dict(analysis.get("overview") or {})
     law_narrative = _normalize_dict(analysis.get("law_narrative") or {})
     business_narrative = _normalize_dict(analysis.get("business_narrative") or {})
 
-    overview_summary = overview_data.get("summary") or analysis.get("overview_summary") or ""
-    overview_parties = overview_data.get("parties") or analysis.get("overview_parties") or ""
-    overview_subject = overview_data.get("subject") or analysis.get("overview_subject") or ""
-    overview_highlights_raw = overview_data.get("highlights") or analysis.get("overview_highlights") or []
-
-    compact_preview = meta.get("compact_preview") or ""
-    compact_block = (
-        f"""
-      <details>
-        <summary style=\"cursor:pointer\"><b>Показать компактный текст для анализа</b></summary>
-        <pre style=\"white-space:pre-wrap;background:#f8fafc;border:1px solid #e5e7eb;border-radius:8px;padding:12px;margin-top:8px;max-height:420px;overflow:auto\">{_escape(compact_preview)}</pre>
-      </details>"""
-        if compact_preview
-        else ""
-    )
+    overview = {
+        "summary": overview_data.get("summary") or analysis.get("overview_summary") or "",
+        "parties": overview_data.get("parties") or analysis.get("overview_parties") or "",
+        "subject": overview_data.get("subject") or analysis.get("overview_subject") or "",
+        "highlights": _text_list(overview_data.get("highlights") or analysis.get("overview_highlights") or []),
+    }
+
+    return {
+        "now": now,
+        "title_score": law_block["score_text"] or business_block["score_text"],
+        "overview": overview,
+        "compact_preview": meta.get("compact_preview") or "",
+        "law": _card("Соответствие законодательству", law_block, law_narrative),
+        "business": _card("Бизнес-риски и логика сделки", business_block, business_narrative),
+        "sources": sources,
+        "meta": meta,
+    }
+
+
+def render_html(meta: Dict[str, Any], analysis: Dict[str, Any]) -> str:
+    return _get_template().render(_report_context(meta, analysis))
 
-    src_info = ""
-    if meta.get("source_path"):
-        src_info = f"<div><b>Файл:</b> {_escape(meta['source_path'])}</div>"
-    elif meta.get("source_url"):
-        src_info = f"<div><b>URL:</b> {_escape(meta['source_url'])}</div>"
-
-    overview_details: List[str] = []
-    if overview_parties:
-        overview_details.append(f"<div><b>Стороны:</b> {_escape(overview_parties)}</div>")
-    if overview_subject:
-        overview_details.append(f"<div><b>Предмет:</b> {_escape(overview_subject)}</div>")
-    overview_details_html = "\n".join(overview_details) if overview_details else '<p style="color:#6b7280">Дополнительные сведения не выявлены.</p>'
-
-    law_summary_text = law_narrative.get("summary") or law_block.get("summary") or ""
-    law_analysis_points = law_narrative.get("analysis_points") or []
-    law_recommendations = law_narrative.get("recommendations") or []
-
-    business_summary_text = business_narrative.get("summary") or business_block.get("summary") or ""
-    business_analysis_points = business_narrative.get("analysis_points") or []
-    business_recommendations = business_narrative.get("recommendations") or []
-
-    law_present = any([
-        law_block["score_text"],
-        law_summary_text,
-        law_block["section_scores"],
-        law_block["issues"],
-    ])
-    business_present = any([
-        business_block["score_text"],
-        business_summary_text,
-        business_block["section_scores"],
-        business_block["issues"],
-    ])
-
-    title_score = law_block["score_text"] or business_block["score_text"]
-
-    law_block_html = ""
-    if law_present:
-        law_block_html = f"""
-  <div class=\"card\">
-    <h2>Соответствие законодательству</h2>
-    <div style=\"display:flex;flex-wrap:wrap;gap:16px;margin-bottom:12px\">
-      {_score_chip('Соответствие законодательству', law_block['risk_color'], law_block['score_text'])}
-    </div>
-    <p>{_escape(law_summary_text)}</p>
-    <p style=\"color:#374151\">{_escape(law_block.get('focus_summary') or '')}</p>
-    <h3>Ключевые зоны внимания</h3>
-    {_focus_list(law_block.get('top_focus') or [])}
-    <h3>Анализ по пунктам</h3>
-    {_bullet_list(law_analysis_points, 'Анализ по пунктам не сформирован.')}
-    <h3>Рекомендации</h3>
-    {_bullet_list(law_recommendations, 'Рекомендации не сформированы.')}
-    <h3>Детализация по разделам</h3>
-    <table style=\"width:100%;border-collapse:collapse\">
-      <thead>
-        <tr>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd\">Раздел</th>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd\">Баллы</th>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd;width:240px\">Уровень</th>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd\">Комментарий</th>
-        </tr>
-      </thead>
-      <tbody>
-        {_section_rows(law_block.get('section_scores') or [])}
-      </tbody>
-    </table>
-    <h3>Замечания и детали</h3>
-    {_issues_list(law_block.get('issues') or [])}
-    <h3>Источники</h3>
-    {_sources_list(sources)}
-  </div>"""
-
-    business_block_html = ""
-    if business_present:
-        business_block_html = f"""
-  <div class=\"card\">
-    <h2>Бизнес-риски и логика сделки</h2>
-    <div style=\"display:flex;flex-wrap:wrap;gap:16px;margin-bottom:12px\">
-      {_score_chip('Бизнес-риски и логика сделки', business_block['risk_color'], business_block['score_text'])}
-    </div>
-    <p>{_escape(business_summary_text)}</p>
-    <p style=\"color:#374151\">{_escape(business_block.get('focus_summary') or '')}</p>
-    <h3>Ключевые зоны внимания</h3>
-    {_focus_list(business_block.get('top_focus') or [])}
-    <h3>Анализ по пунктам</h3>
-    {_bullet_list(business_analysis_points, 'Анализ по пунктам не сформирован.')}
-    <h3>Рекомендации</h3>
-    {_bullet_list(business_recommendations, 'Рекомендации не сформированы.')}
-    <h3>Детализация по разделам</h3>
-    <table style=\"width:100%;border-collapse:collapse\">
-      <thead>
-        <tr>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd\">Раздел</th>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd\">Баллы</th>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd;width:240px\">Уровень</th>
-          <th style=\"text-align:left;padding:8px 12px;border-bottom:1px solid #ddd\">Комментарий</th>
-        </tr>
-      </thead>
-      <tbody>
-        {_section_rows(business_block.get('section_scores') or [])}
-      </tbody>
-    </table>
-    <h3>Замечания и детали</h3>
-    {_issues_list(business_block.get('issues') or [])}
-  </div>"""
-
-    html_doc = f"""<!DOCTYPE html>
-<html lang=\"ru\"><head>
-<meta charset=\"utf-8\"><meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">
-<title>Отчёт по договору — { _escape(title_score) }</title>
-<style>
-  body {{ font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Arial, \"Noto Sans\", \"Liberation Sans\", \"Helvetica Neue\", sans-serif; color:#111827; }}
-  .card {{ background:#fff; border:1px solid #e5e7eb; border-radius:12px; padding:18px; margin:12px 0; }}
-  h1 {{ font-size:20px; margin:6px 0 0 0; }}
-  h2 {{ font-size:18px; margin:0 0 8px 0; }}
-  h3 {{ font-size:16px; margin:12px 0 6px 0; }}
-  small {{ color:#6b7280; }}
-</style>
-</head><body style=\"max-width:980px;margin:24px auto;padding:0 16px;background:#f3f4f6\">
-  <div class=\"card\">
-    <h1>Общая информация о документе</h1>
-    <div style=\"margin-bottom:12px;color:#6b7280\"><small>Сформировано: {now}</small></div>
-    <p>{_escape(overview_summary or 'Описание документа не сформировано.')}</p>
-    {overview_details_html}
-    <h3>Ключевые факты</h3>
-    {_bullet_list(overview_highlights_raw, 'Ключевые факты не выделены.')}
-    {compact_block}
-  </div>
-
-  {law_block_html}
-
-  {business_block_html}
-
-  <div class=\"card\" style=\"color:#374151\">
-    <h2>Метаданные</h2>
-    {src_info}
-    <div><b>Оригинальный размер:</b> { _escape(meta.get('original_bytes')) } байт</div>
-    <div><b>Аналитический фрагмент:</b> { _escape(meta.get('compact_bytes')) } байт</div>
-  </div>
-</body></html>"""
-    return html_doc
+
+def _open_report_file(name: str | None) -> Tuple[int, Path]:
+    safe = _SAFE_RE.sub("_", name or "report")
+    # секунды — для читаемости, наносекунды — чтобы параллельные сохранения не перетирали друг друга
+    sec, nsec = divmod(time.time_ns(), 1_000_000_000)
+    ts = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(sec))}_{nsec:09d}"
+    path = _OUTDIR / f"{ts}_{safe}.html"
+    try:
+        fd = os.open(path, _OPEN_FLAGS, 0o644)
+    except FileNotFoundError:
+        # каталог создаём только если его ещё нет, а не mkdir на каждое сохранение
+        _OUTDIR.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, _OPEN_FLAGS, 0o644)
+    return fd, path
 
 
 def save_report_html(html_str: str, name: str | None = None) -> str:
-    safe = re.sub(r"[^a-zA-Z0-9_.-]+", "_", name or "report")
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    outdir = Path("/workspace/reports")
-    outdir.mkdir(parents=True, exist_ok=True)
-    path = outdir / f"{ts}_{safe}.html"
-    path.write_text(html_str, encoding="utf-8")
+    fd, path = _open_report_file(name)
+    # кодируем один раз и пишем байты напрямую в fd, минуя TextIOWrapper/BufferedWriter
+    data = html_str.encode("utf-8")
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return str(path)
+
+
+def save_report_html_stream(meta: Dict[str, Any], analysis: Dict[str, Any], name: str | None = None) -> str:
+    """Рендерит отчёт сразу в файл кусками, не собирая весь HTML в одну строку."""
+    context = _report_context(meta, analysis)
+    fd, path = _open_report_file(name)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            _get_template().stream(context).dump(fp, encoding="utf-8")
+    except BaseException:
+        # ошибка посреди рендера оставила бы обрезанный HTML — удаляем его
+        path.unlink(missing_ok=True)
+        raise
     return str(path)
@@ -6,6 +6,14 @@ from ..scoring import get_section_index, get_suggest_map
 
 
 _SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+_RISK_LABELS = {
+    color: label.capitalize() + "."
+    for color, label in (
+        ("green", "низкий уровень риска"),
+        ("yellow", "повышенный риск"),
+        ("red", "высокий риск"),
+    )
+}
 _DEFAULT_OVERVIEW_SUMMARY = (
     "Автоматическое резюме по документу; проверьте корректность выводов вручную."
 )
@@ -61,10 +69,9 @@ def summarize_report_block(report: Dict[str, Any], block_title: str) -> Dict[str
     if score_text:
         summary_parts.append(f"Итоговая оценка блока — {score_text}.")
     if risk_color:
-        risk_map = {"green": "низкий уровень риска", "yellow": "повышенный риск", "red": "высокий риск"}
-        label = risk_map.get(risk_color.lower())
+        label = _RISK_LABELS.get(risk_color.lower())
         if label:
-            summary_parts.append(label.capitalize() + ".")
+            summary_parts.append(label)
     section_index = get_section_index()
     focus_lines: List[str] = []
     for focus in top_focus[:3]:
@@ -1,42 +1,129 @@
-from typing import List
-
-try:  # pragma: no cover - optional dependency
-    import torch  # type: ignore
-except Exception:  # noqa: S110
-    torch = None
+import heapq
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+from operator import itemgetter
+from typing import List, Sequence, Tuple
 
 from .config import settings
 from .types import SourceItem
 from .utils import pick_device_auto
 
 _reranker = None
+# защищает первую загрузку модели от параллельных запросов
+_reranker_lock = threading.Lock()
 
 def get_reranker():
     global _reranker
-    if _reranker is None:
-        try:
-            from FlagEmbedding import FlagReranker  # type: ignore
-        except Exception as exc:  # noqa: S110
-            raise RuntimeError("FlagEmbedding is not installed") from exc
-        device = pick_device_auto(settings.RERANK_DEVICE)
-        try:
-            _reranker = FlagReranker(settings.RERANKER_MODEL, use_fp16=(device=="cuda"), device=device)
-            print(f"[RERANK] loaded on: {device}")
-        except Exception as e:
-            print(f"[RERANK] load failed on {device} ({e}); fallback CPU")
-            _reranker = FlagReranker(settings.RERANKER_MODEL, use_fp16=False, device="cpu")
+    if _reranker is not None:
+        return _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = _load_reranker()
     return _reranker
 
+def _load_reranker():
+    try:
+        from FlagEmbedding import FlagReranker  # type: ignore
+    except Exception as exc:  # noqa: S110
+        raise RuntimeError("FlagEmbedding is not installed") from exc
+    device = pick_device_auto(settings.RERANK_DEVICE)
+    try:
+        rr = FlagReranker(settings.RERANKER_MODEL, use_fp16=(device=="cuda"), device=device)
+        print(f"[RERANK] loaded on: {device}")
+        if settings.RERANK_COMPILE and device == "cuda":
+            try:
+                import torch  # type: ignore
+
+                rr.model = torch.compile(rr.model, mode="reduce-overhead", fullgraph=False)
+            except Exception as e:
+                print(f"[RERANK] torch.compile skipped: {e}")
+    except Exception as e:
+        print(f"[RERANK] load failed on {device} ({e}); fallback CPU")
+        rr = FlagReranker(settings.RERANKER_MODEL, use_fp16=False, device="cpu")
+    return rr
+
+def _inference_mode():
+    # torch к этому моменту уже загружен FlagEmbedding-ом, импорт — поиск в sys.modules
+    try:
+        import torch  # type: ignore
+    except Exception:  # noqa: S110
+        return nullcontext()
+    return torch.inference_mode()
+
+def _compute_scores(pairs: Sequence[Tuple[str, str]]) -> List[float]:
+    rr = get_reranker()
+    # inference_mode дешевле no_grad: без version counter-ов и учёта autograd
+    with _inference_mode():
+        scores = rr.compute_score(pairs, batch_size=settings.RERANK_BATCH)
+    if isinstance(scores, (int, float)):
+        # для одной пары FlagReranker возвращает скаляр
+        scores = [scores]
+    return scores
+
+
+class _RerankBatcher:
+    """Склеивает пары от параллельных запросов в один вызов compute_score.
+
+    Первый пришедший поток становится «ведущим»: ждёт окно RERANK_COALESCE_MS,
+    забирает всё накопленное и скорит одним батчем; остальные ждут свой срез.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self._pending: List[Tuple[Sequence[Tuple[str, str]], Future]] = []
+        self._has_leader = False
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        fut: Future = Future()
+        with self._lock:
+            self._pending.append((pairs, fut))
+            lead = not self._has_leader
+            self._has_leader = True
+        if lead:
+            time.sleep(settings.RERANK_COALESCE_MS / 1000.0)
+            # пока предыдущий батч на GPU, очередь продолжает копиться
+            with self._compute_lock:
+                with self._lock:
+                    batch, self._pending = self._pending, []
+                    self._has_leader = False
+                self._run(batch)
+        return fut.result()
+
+    @staticmethod
+    def _run(batch: List[Tuple[Sequence[Tuple[str, str]], Future]]) -> None:
+        try:
+            scores = _compute_scores([p for pairs, _ in batch for p in pairs])
+        except BaseException as exc:
+            for _, fut in batch:
+                fut.set_exception(exc)
+            return
+        start = 0
+        for pairs, fut in batch:
+            end = start + len(pairs)
+            fut.set_result(list(scores[start:end]))
+            start = end
+
+
+_batcher = _RerankBatcher()
+
 def apply_rerank(query: str, sources: List[SourceItem], keep: int) -> List[SourceItem]:
     if not settings.RERANK_ENABLE or len(sources) <= keep:
         return sources[:keep]
     try:
-        rr = get_reranker()
+        get_reranker()
     except RuntimeError:
         return sources[:keep]
     pairs = [(query, s.text[:4000]) for s in sources]
-    scores = rr.compute_score(pairs, batch_size=settings.RERANK_BATCH)
-    ranked = sorted(zip(sources, scores), key=lambda x: x[1], reverse=True)
+    if settings.RERANK_COALESCE_MS > 0:
+        scores = _batcher.score(pairs)
+    else:
+        scores = _compute_scores(pairs)
+    # нужен только top-keep: частичная выборка кучей вместо полной сортировки
+    # (порядок при равных скорах тот же, что у sorted(..., reverse=True))
+    top = heapq.nlargest(keep, zip(sources, scores), key=itemgetter(1))
     if settings.RERANK_DEBUG:
-        print("[RERANK] scores:", [round(sc,3) for _, sc in ranked])
-    return [s for (s, sc) in ranked[:keep]]
+        print("[RERANK] scores:", [round(sc,3) for _, sc in top])
+    return [s for (s, sc) in top]
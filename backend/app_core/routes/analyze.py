@@ -1,4 +1,6 @@
-from typing import List, Dict, Any
+import asyncio
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
 
 from fastapi import APIRouter, HTTPException
 
@@ -29,22 +31,40 @@ DEFAULT_BUSINESS_SUMMARY = (
 )
 
 
-def law_system_prompt(req: AnalyzeRequest) -> str:
+# Системные промпты зависят только от небольшого набора параметров запроса,
+# поэтому рендерим их один раз на комбинацию. sections_lines() входит в ключ:
+# при правке analyze_sections.yaml закешированный промпт не устареет.
+# Строка с юрисдикцией/типом договора/языком стоит в конце шаблонов: инвариантные
+# правила идут префиксом, и KV-кэш Ollama переиспользуется при смене типа договора.
+@lru_cache(maxsize=128)
+def _law_system_prompt(
+    jurisdiction: str, contract_type: str, language: str, scoring_mode: str, sections: str
+) -> str:
     extra_rule = ""
-    if settings.SCORING_MODE == "lenient":
+    if scoring_mode == "lenient":
         extra_rule = get_prompt_template("analyze_system_lenient_rule").strip()
         if extra_rule:
             extra_rule = f"{extra_rule}\n"
     return render_prompt(
         "analyze_system",
-        jurisdiction=req.jurisdiction,
-        contract_type=req.contract_type or "не указан",
-        language=req.language,
-        sections=sections_lines(),
+        jurisdiction=jurisdiction,
+        contract_type=contract_type,
+        language=language,
+        sections=sections,
         extra_rule=extra_rule,
     ).strip()
 
 
+def law_system_prompt(req: AnalyzeRequest) -> str:
+    return _law_system_prompt(
+        req.jurisdiction,
+        req.contract_type or "не указан",
+        req.language,
+        settings.SCORING_MODE,
+        sections_lines(),
+    )
+
+
 def law_user_prompt(req: AnalyzeRequest, ctx: List[SourceItem]) -> str:
     context_lines: List[str] = []
     if ctx:
@@ -66,30 +86,41 @@ def law_user_prompt(req: AnalyzeRequest, ctx: List[SourceItem]) -> str:
     return prompt_text
 
 
-def business_system_prompt(req: AnalyzeRequest) -> str:
+@lru_cache(maxsize=128)
+def _business_system_prompt(contract_type: str, language: str, sections: str) -> str:
     return render_prompt(
         "business_system",
-        contract_type=req.contract_type or "не указан",
-        language=req.language,
-        sections=sections_lines(),
+        contract_type=contract_type,
+        language=language,
+        sections=sections,
     ).strip()
 
 
+def business_system_prompt(req: AnalyzeRequest) -> str:
+    return _business_system_prompt(req.contract_type or "не указан", req.language, sections_lines())
+
+
 def business_user_prompt(req: AnalyzeRequest) -> str:
     return render_prompt("business_user", contract_text=req.contract_text)
 
 
-def overview_system_prompt(req: AnalyzeRequest) -> str:
+@lru_cache(maxsize=128)
+def _overview_system_prompt(jurisdiction: str, contract_type: str, language: str) -> str:
     return render_prompt(
         "overview_system",
-        jurisdiction=req.jurisdiction,
-        contract_type=req.contract_type or "не указан",
-        language=req.language,
+        jurisdiction=jurisdiction,
+        contract_type=contract_type,
+        language=language,
     ).strip()
 
 
+def overview_system_prompt(req: AnalyzeRequest) -> str:
+    return _overview_system_prompt(req.jurisdiction, req.contract_type or "не указан", req.language)
+
+
 def overview_user_prompt(req: AnalyzeRequest) -> str:
-    return render_prompt("overview_user", contract_text=req.contract_text)
+    # для краткого обзора хватает начала договора (стороны, предмет) — не платим prefill за весь текст
+    return render_prompt("overview_user", contract_text=req.contract_text[: settings.OVERVIEW_MAX_CHARS])
 
 
 def _has_all_sections(payload: Dict[str, Any]) -> bool:
@@ -113,16 +144,32 @@ async def _generate_business_payload(req: AnalyzeRequest) -> Dict[str, Any]:
     # Добавляем запас, если модель урезала ответ
     attempts.append(max(base + settings.BUSINESS_RETRY_STEP, base))
 
-    last_payload: Dict[str, Any] = {}
-    for tokens in attempts:
+    async def _attempt(idx: int, tokens: int) -> Tuple[int, Dict[str, Any] | None]:
         try:
-            payload = await _call_business_model(req, tokens)
+            return idx, await _call_business_model(req, tokens)
         except Exception:
-            continue
-        if _has_all_sections(payload):
-            return payload
-        last_payload = payload or {}
-    return last_payload
+            return idx, None
+
+    # Обе попытки идут параллельно: берём первый полный ответ, остальные отменяем.
+    # Если полного нет — как и раньше, отдаём ответ попытки с большим бюджетом.
+    # одинаковые бюджеты (например, BUSINESS_RETRY_STEP=0) не дублируем
+    attempts = list(dict.fromkeys(attempts))
+    tasks = [asyncio.create_task(_attempt(i, t)) for i, t in enumerate(attempts)]
+    results: Dict[int, Dict[str, Any]] = {}
+    try:
+        for fut in asyncio.as_completed(tasks):
+            idx, payload = await fut
+            if payload is None:
+                continue
+            if _has_all_sections(payload):
+                return payload
+            results[idx] = payload or {}
+    finally:
+        for task in tasks:
+            task.cancel()
+        # дожидаемся отмены, чтобы стримы Ollama не пережили запрос (как и в analyze())
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results[max(results)] if results else {}
 
 
 def build_report(parsed: Dict[str, Any], default_summary: str) -> Dict[str, Any]:
@@ -130,8 +177,13 @@ def build_report(parsed: Dict[str, Any], default_summary: str) -> Dict[str, Any]
     missing_keys: List[str] = []
     section_defs = get_section_defs()
     section_index = get_section_index()
+    # индекс по ключу строим один раз; при дублях берём первый раздел, как и раньше
+    raw_by_key: Dict[Any, Dict[str, Any]] = {}
+    for c in parsed.get("sections") or []:
+        if isinstance(c, dict):
+            raw_by_key.setdefault(c.get("key"), c)
     for sdef in section_defs:
-        raw_item = next((c for c in (parsed.get("sections") or []) if c.get("key") == sdef["key"]), None)
+        raw_item = raw_by_key.get(sdef["key"])
         if raw_item is None:
             sections_in.append(SectionScore(key=sdef["key"], raw=0, comment="не найдено"))
             missing_keys.append(sdef["key"])
@@ -212,18 +264,18 @@ async def generate(body: GenerateRequest):
         raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
 
 
-@router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(req: AnalyzeRequest):
-    # 1) RAG — проверка по законодательству
+async def _law_analysis(req: AnalyzeRequest) -> Tuple[List[SourceItem], Dict[str, Any]]:
+    # 1) RAG — проверка по законодательству.
+    # Эмбеддинг, поиск и rerank блокирующие (CPU/GPU) — уводим их в поток, чтобы не стоял event loop
     try:
-        ctx = rag_search_ru(req.contract_text, top_k=settings.RAG_TOP_K)
+        ctx = await asyncio.to_thread(rag_search_ru, req.contract_text, settings.RAG_TOP_K)
     except Exception:
         ctx = []
     ctx = dedup_sources_by_hash(ctx)
     # 1.1) rerank
     try:
         keep = min(settings.RERANK_KEEP, len(ctx))
-        ctx = apply_rerank(req.contract_text, ctx, keep=keep)
+        ctx = await asyncio.to_thread(apply_rerank, req.contract_text, ctx, keep)
         ctx = dedup_sources_by_hash(ctx)
     except Exception as e:
         print("[RERANK] failed:", e)
@@ -235,26 +287,49 @@ async def analyze(req: AnalyzeRequest):
         law_parsed = await ollama_chat_json(sys, usr, req.model, max_tokens=req.max_tokens or 1024)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+    return ctx, law_parsed
 
-    law_report = build_report(law_parsed, DEFAULT_LAW_SUMMARY)
 
-    # 3) LLM — бизнес-риски без RAG
+async def _overview_payload(req: AnalyzeRequest) -> Dict[str, Any]:
+    if not req.include_overview:
+        return {}
     try:
-        business_parsed = await _generate_business_payload(req)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
-
-    business_report = build_report(business_parsed, DEFAULT_BUSINESS_SUMMARY)
-
-    try:
-        overview_raw = await ollama_chat_json(
+        return await ollama_chat_json(
             overview_system_prompt(req),
             overview_user_prompt(req),
             req.model,
             max_tokens=min(req.max_tokens or 600, 600),
         )
     except Exception:
-        overview_raw = {}
+        return {}
+
+
+@router.post("/analyze", response_model=AnalyzeResponse)
+async def analyze(req: AnalyzeRequest):
+    # Юридическая оценка (RAG + LLM), бизнес-риски без RAG и обзор документа
+    # друг от друга не зависят — запускаем их параллельно. Бизнес-оценка сама даёт
+    # две генерации, итого до четырёх одновременно: на стороне Ollama нужен OLLAMA_NUM_PARALLEL >= 4.
+    law_task = asyncio.create_task(_law_analysis(req))
+    business_task = asyncio.create_task(_generate_business_payload(req))
+    overview_task = asyncio.create_task(_overview_payload(req))
+    tasks = (law_task, business_task, overview_task)
+    try:
+        ctx, law_parsed = await law_task
+        try:
+            business_parsed = await business_task
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Ollama error: {e}")
+        overview_raw = await overview_task
+    except BaseException:
+        # юридическая (или бизнес-) оценка упала — остальные генерации не ждём,
+        # а отменяем, чтобы ответить сразу и не занимать GPU
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    law_report = build_report(law_parsed, DEFAULT_LAW_SUMMARY)
+    business_report = build_report(business_parsed, DEFAULT_BUSINESS_SUMMARY)
     overview = build_document_overview(overview_raw)
 
     law_narrative = summarize_report_block(law_report, "Соответствие законодательству")
@@ -8,7 +8,7 @@ import httpx, re, os
 import anyio
 import contextlib
 
-from ..report.render import render_html, save_report_html
+from ..report.render import render_html, save_report_html, save_report_html_stream
 
 
 router = APIRouter(prefix="/doc", tags=["doc"])
@@ -194,15 +194,19 @@ async def analyze_file(
     }
 
     if (report_format or "").lower() == "html":
-        html_str = render_html(
-            meta={"source_path": str(p), "compact_preview": compact, "original_bytes": resp["original_bytes"], "compact_bytes": resp["compact_bytes"]},
-            analysis=analysis
-        )
-        if report_save:
-            out = save_report_html(html_str, report_name or Path(path).stem)
-            resp["report_path"] = out
+        meta = {"source_path": str(p), "compact_preview": compact, "original_bytes": resp["original_bytes"], "compact_bytes": resp["compact_bytes"]}
+        # рендер и запись файла синхронные — выполняем в пуле потоков, не блокируя event loop
         if report_inline:
+            html_str = await anyio.to_thread.run_sync(render_html, meta, analysis)
+            if report_save:
+                out = await anyio.to_thread.run_sync(save_report_html, html_str, report_name or Path(path).stem)
+                resp["report_path"] = out
             resp["report_html"] = html_str
+        elif report_save:
+            # HTML в ответ не нужен — шаблон пишется в файл потоком, без строки целиком
+            resp["report_path"] = await anyio.to_thread.run_sync(
+                save_report_html_stream, meta, analysis, report_name or Path(path).stem
+            )
 
     return resp 
 
@@ -276,14 +280,18 @@ async def analyze_url(
     }
 
     if (report_format or "").lower() == "html":
-        html_str = render_html(
-            meta={"source_url": url, "compact_preview": compact, "original_bytes": resp["original_bytes"], "compact_bytes": resp["compact_bytes"]},
-            analysis=analysis
-        )
-        if report_save:
-            out = save_report_html(html_str, report_name or "document")
-            resp["report_path"] = out
+        meta = {"source_url": url, "compact_preview": compact, "original_bytes": resp["original_bytes"], "compact_bytes": resp["compact_bytes"]}
+        # рендер и запись файла синхронные — выполняем в пуле потоков, не блокируя event loop
         if report_inline:
+            html_str = await anyio.to_thread.run_sync(render_html, meta, analysis)
+            if report_save:
+                out = await anyio.to_thread.run_sync(save_report_html, html_str, report_name or "document")
+                resp["report_path"] = out
             resp["report_html"] = html_str
+        elif report_save:
+            # HTML в ответ не нужен — шаблон пишется в файл потоком, без строки целиком
+            resp["report_path"] = await anyio.to_thread.run_sync(
+                save_report_html_stream, meta, analysis, report_name or "document"
+            )
 
     return resp
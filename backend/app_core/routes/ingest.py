@@ -3,15 +3,17 @@ import re
 from pathlib import Path
 from fastapi import APIRouter, Body, HTTPException
 from typing import List, Optional, Dict, Any
-import httpx, socket, asyncio, time
+import httpx, socket, asyncio, time, os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urlparse, urlunparse
 
 from ..types import IngestItem, IngestPayload  
 from ..config import settings
 
-from ..rag.store import ingest_items, ensure_collection
+from ..rag.store import ingest_items, ensure_collection, load_jsonl_items
 from ..rag.pub_pravo import parse_publication_html
-from ..rag.gk_txt import parse_gk_file
+from ..rag.gk_txt import parse_gk_file_job
 
 
 router = APIRouter(prefix="/rag")
@@ -22,17 +24,10 @@ def rag_ingest_sample():
     Загружает demo-корпус из corpus/ru_sample.jsonl
     """
     ensure_collection()
-    import json, pathlib, hashlib
-    p = pathlib.Path("/workspace/corpus/ru_sample.jsonl")
+    p = Path("/workspace/corpus/ru_sample.jsonl")
     if not p.exists():
         return {"error": f"not found: {p}"}
-    items: List[IngestItem] = []
-    for line in p.read_text(encoding="utf-8").splitlines():
-        if not line.strip():
-            continue
-        d = json.loads(line)
-        items.append(IngestItem(**d))
-    return ingest_items(items)
+    return ingest_items(load_jsonl_items(p))
 
 
 @router.post("/ingest")
@@ -302,6 +297,7 @@ def ingest_gk_local(
 
     all_items: List[IngestItem] = []
     per_file_stats: List[Dict[str, Any]] = []
+    jobs: List[tuple] = []
 
     for f in files:
         p = Path(f if f.startswith("/") else str(root / f))
@@ -314,13 +310,25 @@ def ingest_gk_local(
             title_override = act_titles[p.name]
         elif part_no in (1,2,3,4):
             title_override = f"Гражданский кодекс РФ (Часть {part_no})"
-
-        try:
-            items = parse_gk_file(p, part_no=part_no or 0, act_title=title_override, revision_date=revision_date)
-            per_file_stats.append({"file": str(p), "parsed": len(items), "part_no": part_no})
-            all_items.extend(items)
-        except Exception as e:
-            per_file_stats.append({"file": str(p), "parsed": 0, "error": str(e)})
+        jobs.append((p, part_no, title_override, revision_date))
+
+    # части ГК независимы и парсятся чистым python (держит GIL) — раскидываем по процессам.
+    # Не fork: воркер API многопоточный и держит torch/sqlite/gRPC-канал Qdrant;
+    # forkserver-дочкам достаточно импорта rag.gk_txt
+    if len(jobs) > 1:
+        workers = min(len(jobs), 4, os.cpu_count() or 1)
+        ctx = multiprocessing.get_context("forkserver")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+            results = list(ex.map(parse_gk_file_job, jobs))
+    else:
+        results = [parse_gk_file_job(job) for job in jobs]
+
+    for (p, part_no, _, _), (items, err) in zip(jobs, results):
+        if err is not None:
+            per_file_stats.append({"file": str(p), "parsed": 0, "error": err})
+            continue
+        per_file_stats.append({"file": str(p), "parsed": len(items), "part_no": part_no})
+        all_items.extend(items)
 
     # 2) Заливаем батчами
     total = 0
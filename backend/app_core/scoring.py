@@ -5,6 +5,11 @@ from typing import Any, Dict, List, Tuple
 
 import yaml
 
+try:  # pragma: no cover - libyaml bindings are optional
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # noqa: S110
+    from yaml import SafeLoader as _YamlLoader
+
 from .config import settings
 from .types import FocusItem, SectionScore
 
@@ -23,7 +28,7 @@ class _AnalyzeConfigCache:
         data: Dict[str, Any] = {}
         try:
             with open(self._config_path, "r", encoding="utf-8") as fp:
-                raw = yaml.safe_load(fp) or {}
+                raw = yaml.load(fp, Loader=_YamlLoader) or {}
                 if isinstance(raw, dict):
                     data = raw
         except FileNotFoundError:
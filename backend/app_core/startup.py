@@ -1,8 +1,16 @@
 from fastapi import FastAPI
-import asyncio, httpx, torch
+import asyncio, httpx
 from .config import settings
+from .prompts import preload_prompts
 
 def register_startup(app: FastAPI):
+    @app.on_event("startup")
+    async def warm_prompts():
+        try:
+            preload_prompts()
+        except (OSError, ValueError) as e:
+            print(f"[startup] WARNING: prompt preload failed: {e}")
+
     @app.on_event("startup")
     async def startup_checks():
         if not settings.STARTUP_CHECKS:
@@ -44,14 +52,16 @@ def register_startup(app: FastAPI):
         if not ok_qdrant:
             print("[startup] WARNING: qdrant not reachable")
 
-        # Torch/CUDA (без инициализации девайса)
-        try:
-            print(f"[startup] torch: {torch.__version__}, cuda.available: {torch.cuda.is_available()}, cuda.version: {torch.version.cuda}")
-            if settings.STARTUP_CUDA_NAME and torch.cuda.is_available():
-                name = torch.cuda.get_device_name(0)
-                print(f"[startup] cuda device: {name}")
-        except Exception as e:
-            print(f"[startup] torch info error: {e}")
+        # Torch/CUDA (без инициализации девайса); torch тяжёлый, импортируем только по флагу
+        if settings.STARTUP_CUDA_NAME:
+            try:
+                import torch  # type: ignore
+                print(f"[startup] torch: {torch.__version__}, cuda.available: {torch.cuda.is_available()}, cuda.version: {torch.version.cuda}")
+                if torch.cuda.is_available():
+                    name = torch.cuda.get_device_name(0)
+                    print(f"[startup] cuda device: {name}")
+            except Exception as e:
+                print(f"[startup] torch info error: {e}")
 
         # Тест-генерация (по флагу)
         if ok_ollama and settings.SELF_CHECK_GEN:
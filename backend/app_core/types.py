@@ -15,6 +15,8 @@ class AnalyzeRequest(BaseModel):
     effective_date: Optional[str] = None
     model: Optional[str] = None
     max_tokens: Optional[int] = 1024
+    # обзор документа — отдельный вызов LLM; клиенты, которым он не нужен, могут его отключить
+    include_overview: bool = True
 
 # Internal
 class SectionScore(BaseModel):
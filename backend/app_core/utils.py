@@ -2,12 +2,7 @@ import ast
 import json
 import re
 import hashlib
-from typing import Any, Dict, List
-
-try:  # pragma: no cover - optional dependency
-    import torch  # type: ignore
-except Exception:  # noqa: S110 - fallback when torch is unavailable
-    torch = None
+from typing import Any, Dict, Iterator, List
 
 from .types import SourceItem
 
@@ -49,21 +44,73 @@ def extract_json(text: str) -> Dict[str, Any]:
             return parsed
     except Exception:
         pass
-    start = text.find("{")
-    last_good = None
-    while start != -1:
-        depth = 0
+    for cand in _iter_balanced_objects(text):
+        try:
+            parsed = json.loads(cand)
+        except Exception:
+            continue
+        # пустой {} из прозы не должен заслонять настоящий ответ дальше по тексту
+        if isinstance(parsed, dict) and parsed:
+            return parsed
+    return {}
+
+
+class JsonObjectTracker:
+    """Следит за балансом скобок JSON (с учётом строк и экранирования).
+
+    Один автомат и для потока токенов Ollama, и для поиска объектов в готовом тексте.
+    """
+
+    __slots__ = ("depth", "in_str", "escape")
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_str = False
+        self.escape = False
+
+    def scan(self, text: str, start: int = 0) -> int:
+        """Индекс сразу за «}», закрывшей объект верхнего уровня, или -1, если текст кончился раньше."""
         for i in range(start, len(text)):
-            if text[i] == "{": depth += 1
-            elif text[i] == "}":
-                depth -= 1
-                if depth == 0:
-                    cand = text[start:i+1]
-                    try: last_good = json.loads(cand)
-                    except Exception: pass
-                    break
-        start = text.find("{", start + 1)
-    return last_good or {}
+            ch = text[i]
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = self.depth > 0
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    return i + 1
+        return -1
+
+    def feed(self, text: str) -> bool:
+        """True, как только закрылся первый JSON-объект верхнего уровня."""
+        return self.scan(text) >= 0
+
+
+def _iter_balanced_objects(text: str) -> Iterator[str]:
+    """Отдаёт сбалансированные {...}: сначала объект верхнего уровня, затем вложенные в него.
+
+    Скобки внутри строковых литералов (с учётом экранирования) не считаются.
+    Генератор ленивый: если первый кандидат разобрался, текст проходится один раз.
+    """
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        if start < 0:
+            return
+        end = JsonObjectTracker().scan(text, start)
+        if end >= 0:
+            yield text[start:end]
+        # непарная «{» в прозе или неразбираемая обёртка вокруг настоящего объекта:
+        # продолжаем со следующей «{», а не обрываем поиск
+        pos = start + 1
 
 def text_hash(t: str) -> str:
     return hashlib.sha256(t.encode("utf-8")).hexdigest()[:16]
@@ -73,12 +120,15 @@ def pick_device_auto(req: str) -> str:
         return "cuda"
     if req == "cpu":
         return "cpu"
-    if torch is not None:
-        try:
-            return "cuda" if torch.cuda.is_available() else "cpu"
-        except Exception:
-            return "cpu"
-    return "cpu"
+    # torch импортируется лениво: модуль нужен только при загрузке моделей
+    try:  # pragma: no cover - optional dependency
+        import torch  # type: ignore
+    except Exception:  # noqa: S110 - fallback when torch is unavailable
+        return "cpu"
+    try:
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except Exception:
+        return "cpu"
 
 def dedup_sources_by_hash(sources: List[SourceItem]) -> List[SourceItem]:
     seen, out = set(), []
@@ -88,5 +138,5 @@ def dedup_sources_by_hash(sources: List[SourceItem]) -> List[SourceItem]:
     return out
 
 def deterministic_point_id(key: str) -> int:
-    h = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
-    return int(h, 16)
+    # первые 8 байт sha1 как big-endian int — то же, что int(hexdigest()[:16], 16), без hex-строки
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")